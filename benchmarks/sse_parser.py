@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares bf4py's SSE parser with sseclient-py (if installed) on a recorded stream, without network.
+# The stream is rebuilt from a capture file of bf4py.capture (see LiveData.start_recording()). The capture
+# keeps every event with its receive time, events received within --gap seconds of each other are fed as
+# one chunk, so the chunks follow the bursts in which the server delivered the events.
+#
+#   python benchmarks/sse_parser.py quotes.cap.gz [--gap 0.001] [--repeat 5] [--endpoint bid_ask_overview]
+
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bf4py._sse import SSEStream
+from bf4py.capture import CaptureReader
+
+
+class _Response():
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        return iter(self.chunks)
+
+    def __iter__(self):
+        return self.iter_content()
+
+    def close(self):
+        pass
+
+
+def read_chunks(path, gap, max_chunk, endpoint=None):
+    """
+    Returns the recorded events as SSE wire format, split into chunks of events received together.
+    """
+    chunks = []
+    current = []
+    size = 0
+    last_received = None
+    for received, ep, _, payload in CaptureReader(path):
+        if endpoint is not None and ep != endpoint:
+            continue
+        message = b'data: ' + payload + b'\n\n'
+        if len(current) > 0 and (received - last_received > gap or size + len(message) > max_chunk):
+            chunks.append(b''.join(current))
+            current = []
+            size = 0
+        current.append(message)
+        size += len(message)
+        last_received = received
+    if len(current) > 0:
+        chunks.append(b''.join(current))
+    return chunks
+
+
+def best_of(repeat, function):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = function()
+        times.append(time.perf_counter() - t0)
+    return min(times), count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('capture', help='capture file written by bf4py.capture.CaptureWriter')
+    parser.add_argument('--gap', type=float, default=0.001, help='seconds between events still received in one chunk')
+    parser.add_argument('--max-chunk', type=int, default=65536, help='largest chunk, the read size of the parser')
+    parser.add_argument('--endpoint', help='only events of this endpoint')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = read_chunks(args.capture, args.gap, args.max_chunk, args.endpoint)
+    events = sum(c.count(b'\n\n') for c in chunks)
+    if events == 0:
+        sys.exit('No events in ' + args.capture)
+    nbytes = sum(len(c) for c in chunks)
+    print('events:', events, '| bytes: %.1f MB' % (nbytes / 1e6), '| chunks:', len(chunks),
+          '| mean chunk: %.0f bytes' % (nbytes / len(chunks)))
+
+    def parse_bf4py(decode):
+        stream = SSEStream(_Response(chunks)).events()
+        return sum(1 for e in stream if not decode or json.loads(e.data))
+
+    candidates = [('bf4py', parse_bf4py)]
+    try:
+        import sseclient
+
+        def parse_sseclient(decode):
+            stream = sseclient.SSEClient(_Response(chunks)).events()
+            return sum(1 for e in stream if not decode or json.loads(e.data))
+
+        candidates.append(('sseclient-py', parse_sseclient))
+    except ImportError:
+        print('sseclient-py not installed, measuring bf4py only')
+
+    for name, parse in candidates:
+        seconds, count = best_of(args.repeat, lambda: parse(False))
+        seconds_decoded, _ = best_of(args.repeat, lambda: parse(True))
+        assert count == events
+        print(name.ljust(13), 'parse %.3f s   parse + json.loads %.3f s' % (seconds, seconds_decoded))
+
+
+if __name__ == '__main__':
+    main()
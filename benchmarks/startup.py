@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Measures import time of bf4py, construction time of BF4Py and, with --network, the latency of the first request.
+# Every measurement runs in a fresh interpreter, so nothing is cached between runs.
+# Exits with status 1 if "import bf4py" loads requests or its median exceeds --max-import-ms.
+#
+#   python benchmarks/startup.py [--runs 20] [--import-only | --network] [--max-import-ms 5]
+
+import argparse, json, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import bf4py
+t1 = time.perf_counter()
+result = {'import': t1 - t0, 'requests_loaded': 'requests' in sys.modules}
+if {construct}:
+    client = bf4py.BF4Py(default_isin='DE0007164600')
+    t2 = time.perf_counter()
+    result['construct'] = t2 - t1
+    if {network}:
+        client.equities.equity_details()
+        result['first_request'] = time.perf_counter() - t2
+print(json.dumps(result))
+"""
+
+
+def run(construct, network):
+    code = _PROBE.replace('{construct}', str(construct)).replace('{network}', str(network))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', code], env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--import-only', action='store_true', help='only measure the import')
+    parser.add_argument('--network', action='store_true', help='also measure the first request (needs access to boerse-frankfurt.de)')
+    parser.add_argument('--max-import-ms', type=float, default=5., help='fail if the median import time exceeds this')
+    args = parser.parse_args()
+
+    samples = [run(not args.import_only, args.network) for _ in range(args.runs)]
+    print('runs:', args.runs, '| requests loaded by import bf4py:', samples[0]['requests_loaded'])
+    for key in ('import', 'construct', 'first_request'):
+        values = [s[key] * 1000 for s in samples if key in s]
+        if len(values) > 0:
+            print(key.ljust(14), 'median %8.2f ms   min %8.2f ms' % (statistics.median(values), min(values)))
+
+    failures = []
+    if any(s['requests_loaded'] for s in samples):
+        failures.append('import bf4py loads requests')
+    import_ms = statistics.median(s['import'] * 1000 for s in samples)
+    if import_ms > args.max_import_ms:
+        failures.append('import bf4py takes %.2f ms, more than %.2f ms' % (import_ms, args.max_import_ms))
+    for failure in failures:
+        print('FAILED:', failure)
+    sys.exit(1 if len(failures) > 0 else 0)
+
+
+if __name__ == '__main__':
+    main()
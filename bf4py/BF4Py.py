@@ -2,29 +2,38 @@
 # -*- coding: utf-8 -*-
 
 
-from .equities import Equities
-from .news import News
-from .derivatives import Derivatives
-from .general import General
-from .company import Company
-from .live_data import LiveData
-from .bonds import Bonds
-
-from .connector import BF4PyConnector
+from importlib import import_module
 
 
 class BF4Py():
+    # Facades are created on first access, attribute name: (module, class)
+    _facades = {'equities': ('.equities', 'Equities'),
+                'news': ('.news', 'News'),
+                'company': ('.company', 'Company'),
+                'derivatives': ('.derivatives', 'Derivatives'),
+                'general': ('.general', 'General'),
+                'live_data': ('.live_data', 'LiveData'),
+                'bonds': ('.bonds', 'Bonds')}
+    
     def __init__(self, default_isin=None, default_mic=None):
         self.default_isin = default_isin
         self.default_mic = default_mic
         
-        self.connector = BF4PyConnector()
+        # Imported here, as the connector loads requests, which "import bf4py" should not
+        from .connector import get_connector
+        self.connector = get_connector()
+    
+    def __getattr__(self, name):
+        if name not in BF4Py._facades:
+            raise AttributeError("'BF4Py' object has no attribute '" + name + "'")
         
-        self.equities = Equities(self.connector, self.default_isin)
-        self.news = News(self.connector, self.default_isin)
-        self.company = Company(self.connector, self.default_isin)
-        self.derivatives = Derivatives(self.connector, self.default_isin)
-        self.general = General(self.connector, self.default_isin)
-        self.live_data = LiveData(self.connector, self.default_isin)
-        self.bonds = Bonds(self.connector, self.default_isin, self.default_mic)
-
+        module, cls = BF4Py._facades[name]
+        facade_class = getattr(import_module(module, __package__), cls)
+        if name == 'bonds':
+            facade = facade_class(self.connector, self.default_isin, self.default_mic)
+        else:
+            facade = facade_class(self.connector, self.default_isin)
+        
+        # Cache as instance attribute, so __getattr__ is not called again
+        setattr(self, name, facade)
+        return facade
@@ -2,4 +2,5 @@
 # -*- coding: utf-8 -*-
 
 
-from .BF4Py import BF4Py
\ No newline at end of file
+# BF4Py imports requests and the facades only when instantiated, so this import stays light
+from .BF4Py import BF4Py
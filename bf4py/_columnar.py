@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, json, os
+
+
+def _to_columns(records: list):
+    """
+    Converts a list of dicts into a dict of lists (one list per key). Missing values become None.
+    """
+    columns = {}
+    for r in records:
+        for k in r:
+            if k not in columns:
+                columns[k] = None
+    table = {k: [r.get(k) for r in records] for k in columns}
+    return table
+
+
+def _from_columns(table: dict):
+    keys = list(table)
+    if len(keys) == 0:
+        return []
+    return [dict(zip(keys, values)) for values in zip(*(table[k] for k in keys))]
+
+
+def write_partition(path: str, records: list, meta: dict = None):
+    """
+    Writes records as gzip compressed columnar JSON. The file is replaced atomically,
+    so an existing partition is always complete.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    content = {'rows': len(records),
+               'meta': meta if meta is not None else {},
+               'columns': _to_columns(records)}
+
+    tmp_file = path + '.tmp'
+    with gzip.open(tmp_file, 'wt', encoding='utf-8') as f:
+        json.dump(content, f, separators=(',', ':'))
+    os.replace(tmp_file, path)
+
+
+def read_partition(path: str, columns: list = None):
+    """
+    Reads a partition written by write_partition(). Returns dict of lists, restricted to given columns if provided.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        content = json.load(f)
+    table = content['columns']
+    if columns is not None:
+        table = {k: table.get(k, [None] * content['rows']) for k in columns}
+    return table
+
+
+def read_partition_records(path: str):
+    return _from_columns(read_partition(path))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Server-sent events parser working on raw byte chunks. Events are located with bytes.find()
+# on a bytearray buffer, data is handed out as bytes, which json.loads() accepts directly.
+
+import socket
+
+
+class Event():
+    __slots__ = ('event', 'data', 'id')
+
+    def __init__(self, event: str = 'message', data: bytes = b'', id: str = None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self):
+        return 'Event(' + self.event + ', ' + repr(self.data[:50]) + ')'
+
+
+def _parse_event(block):
+    event = 'message'
+    data = []
+    event_id = None
+    for line in block.split(b'\n'):
+        if line.startswith(b'data:'):
+            # Fast path, by far the most frequent field
+            data.append(line[6:] if line.startswith(b'data: ') else line[5:])
+            continue
+        if len(line) == 0 or line.startswith(b':'):
+            continue
+        field, _, value = line.partition(b':')
+        if value.startswith(b' '):
+            value = value[1:]
+        if field == b'data':
+            data.append(value)
+        elif field == b'event':
+            event = value.decode()
+        elif field == b'id':
+            event_id = value.decode()
+    if len(data) == 0:
+        return None
+    return Event(event, data[0] if len(data) == 1 else b'\n'.join(data), event_id)
+
+
+class SSEStream():
+    """
+    Event stream of a streaming requests response. Iterate events() to receive Event objects
+    with event type (str), data (bytes) and id.
+    """
+    def __init__(self, response, chunk_size: int = 65536):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.last_event_id = None
+
+    def _chunks(self):
+        # read1() returns whatever already arrived (at most chunk_size bytes) instead of waiting for a full
+        # chunk, which matters for responses without chunked transfer encoding
+        read1 = getattr(getattr(self.response, 'raw', None), 'read1', None)
+        if read1 is None:
+            yield from self.response.iter_content(chunk_size=self.chunk_size)
+            return
+        while True:
+            chunk = read1(self.chunk_size, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+
+    def events(self):
+        buffer = bytearray()
+        skip_lf = False
+
+        for chunk in self._chunks():
+            if skip_lf:
+                # Second half of a CRLF split between chunks
+                skip_lf = False
+                if chunk.startswith(b'\n'):
+                    chunk = chunk[1:]
+            if len(chunk) == 0:
+                continue
+            if b'\r' in chunk:
+                # Normalize line endings. A trailing CR ends its line right away, so an event is not held back
+                # until more data arrives, a following LF is dropped
+                skip_lf = chunk.endswith(b'\r')
+                chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+            # Boundary may span the previous and the current chunk
+            position = 0
+            search = max(0, len(buffer) - 1)
+            buffer += chunk
+            view = memoryview(buffer)
+            try:
+                while True:
+                    end = buffer.find(b'\n\n', search)
+                    if end < 0:
+                        break
+                    # Single copy of the event block out of the buffer
+                    event = _parse_event(view[position:end].tobytes())
+                    position = end + 2
+                    search = position
+                    if event is not None:
+                        if event.id is not None:
+                            self.last_event_id = event.id
+                        yield event
+            finally:
+                view.release()
+            if position > 0:
+                del buffer[:position]
+
+    def close(self):
+        """
+        Closes the stream. May be called from another thread, a blocking read is woken up by shutting down the socket.
+        """
+        sock = _socket_of(self.response)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.response.close()
+
+
+def _socket_of(response):
+    # Socket of a requests response, location differs between urllib3 versions
+    raw = getattr(response, 'raw', None)
+    connection = getattr(raw, 'connection', None) or getattr(raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        try:
+            sock = raw._fp.fp.raw._sock
+        except AttributeError:
+            return None
+    return sock
@@ -1,134 +1,255 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-def _get_salt():
-    import re, requests
-    result = requests.get('https://www.boerse-frankfurt.de/main-es2015.ac96265ebda80215a714.js')
-    salt = re.findall(r'(?<=salt:")\w*', result.text)
-    return salt[0]
-
-def _create_header(url):
-    ids = _create_ids(url=url)
-    headers = {'authority': 'api.boerse-frankfurt.de', 
-               'origin': 'https://www.boerse-frankfurt.de',
-               'referer': 'https://www.boerse-frankfurt.de/',
-               'client-date': '' + ids['timestr'],
-               'x-client-traceid': '' + ids['traceid'],
-               'x-security': '' + ids['xsecurity']}
-            
-    return headers
-
-def _create_ids(url):
-    from datetime import datetime
-    import hashlib
-    
-    salt="w4ivc1ATTGta6njAZzMbkL3kJwxMfEAKDa3MNr"
-    
-    timeutc=datetime.utcnow()
-    timelocal=datetime.now()
-    timestr = timeutc.isoformat(timespec='milliseconds') + 'Z'
+import heapq, time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-    traceidbase = timestr + url + salt
-    encoded = traceidbase.encode()
-    traceid = hashlib.md5(encoded).hexdigest()
+from requests.exceptions import Timeout
 
-    xsecuritybase = timelocal.strftime("%Y%m%d%H%M") 
-    encoded = xsecuritybase.encode()
-    xsecurity = hashlib.md5(encoded).hexdigest()
-    
-    return {'timestr':timestr, 'traceid':traceid, 'xsecurity':xsecurity}
+from .profiling import _span
 
-# Functions for retrieving DATA
 
-def _get_data_url(function: str, params:dict):
-    import urllib
-    baseurl = "https://api.boerse-frankfurt.de/v1/data/"
-    p_string = urllib.parse.urlencode(params)
-    return baseurl + function + '?' + p_string
+class Endpoint():
+    """
+    Describes a paginated endpoint: request type, keys of data list and total count as well as page sizes.
+    The page size starts at max_page_size, is halved on timeouts and grows back after successful pages.
+    """
+    def __init__(self, function: str, data_key: str = 'data', count_key: str = 'totalCount', method: str = 'data',
+                 max_page_size: int = 1000, min_page_size: int = 50):
+        assert method in ('data', 'search'), 'Unknown request method ' + str(method)
+        self.function = function
+        self.data_key = data_key
+        self.count_key = count_key
+        self.method = method
+        self.max_page_size = max_page_size
+        self.min_page_size = min_page_size
 
-def _data_request(function: str, params: dict):
-    import requests, json
-    
-    url = _get_data_url(function, params)
-    header = _create_header(url)
-    header['accept'] = 'application/json, text/plain, */*'
-    req = requests.get(url, headers=header, timeout=(3.5, 15))
-    data = json.loads(req.text)
-    
-    return data
+    def __repr__(self):
+        return 'Endpoint(' + self.function + ')'
 
-# Functions for retrieving SEARCH requests
 
-def _get_search_url(function: str, params:dict):
-    import urllib
-    baseurl = "https://api.boerse-frankfurt.de/v1/search/"
-    p_string = urllib.parse.urlencode(params)
-    return baseurl + function + ('?' + p_string if p_string != '' else '')
+TICK_DATA = Endpoint('tick_data', data_key='ticks', max_page_size=10000)
+BID_ASK_HISTORY = Endpoint('bid_ask_history')
+DERIVATIVES_TRADE_HISTORY = Endpoint('derivatives_trade_history', count_key='totalElements')
+DERIVATIVE_SEARCH = Endpoint('derivative_search', count_key='recordsTotal', method='search')
+BOND_SEARCH = Endpoint('bond_search', count_key='recordsTotal', method='search')
+EQUITY_SEARCH = Endpoint('equity_search', count_key='recordsTotal', method='search')
+CATEGORY_NEWS = Endpoint('category_news')
+INSTRUMENT_NEWS = Endpoint('instrument_news')
 
-def _search_request(function: str, params: dict):
-    import requests, json
-    
-    url = _get_search_url(function, {})
-    header = _create_header(url)
-    header['accept'] = 'application/json, text/plain, */*'
-    header['content-type'] = 'application/json; charset=UTF-8'
-    req = requests.post(url, headers=header, timeout=(3.5, 15), json=params)
-    data = json.loads(req.text)
-    
-    return data
 
-# Functions for STREAM requests
+def _iter_pages(connector, endpoint: Endpoint, params: dict, limit: int = 0, offset: int = 0, stop: callable = None):
+    """
+    Generator yielding pages (lists of records) of a paginated endpoint.
 
-def _stream_request(function: str, params: dict):
-    import sseclient, requests
-    
-    url = _get_data_url(function, params)
-    header = _create_header(url)
-    header['accept'] = 'text/event-stream'
-    header['cache-control'] = 'no-cache, no-store, must-revalidate, max-age=0'
-    
-    socket = requests.get(url, stream=True, headers=header, timeout=(3.5, 5))
-    client = sseclient.SSEClient(socket)
-    
-    return client
+    Parameters
+    ----------
+    connector : BF4PyConnector
+        Connector used for requests.
+    endpoint : Endpoint
+        Description of the endpoint.
+    params : dict
+        Request parameters without limit and offset.
+    limit : int, optional
+        Maximum count of records. The default is 0 (=unlimited).
+    offset : int, optional
+        Position of first record. The default is 0.
+    stop : callable, optional
+        Predicate getting one record, paging stops before the first record for which it returns True.
 
-def _read_chunked(request:callable, function:str, args:dict, CHUNK_SIZE:int=1000, 
-                  identifiers:dict={'data':'data', 'numberElements':'totalCount'}):
-    
-    if 'limit' in args:
-        limit = args['limit']
-    else:
-        limit = 0
-    if 'offset' in args:
-        offset = args['offset']
-    else:
-        offset = 0
-    
-    if limit > 0:
-        maxCount = limit + offset
-    else:
-        maxCount = offset + CHUNK_SIZE + 1 #Initialwert, wird überschrieben
-    
-    result_list = []
+    """
+    request = connector.data_request if endpoint.method == 'data' else connector.search_request
+    tuner = getattr(connector, 'page_tuner', None)
+    profiler = getattr(connector, 'profiler', None)
+    params = dict(params)
+    # Upper bound for page size, halved on timeouts and grown back after successful pages
+    max_page_size = endpoint.max_page_size if tuner is None else tuner.upper_page_size(endpoint)
+    cap = max_page_size
     position = offset
-    #i = 0
-    
-    while position < maxCount:
-        print('read from position', position, 'size', CHUNK_SIZE)
-        args['offset'] = position
-        args['limit'] = min(CHUNK_SIZE, maxCount - position)
-        
-        data = request(function, args)
-        
-        if limit == 0:
-            maxCount = data[identifiers['numberElements']]
-        
-        result_list += data[identifiers['data']]
-        
-        #i += 1
-        position += CHUNK_SIZE
-
-    return result_list, data[identifiers['numberElements']]
+    count = 0
+    total = None
+
+    while total is None or position < total:
+        page_size = cap if tuner is None else min(cap, tuner.suggest(endpoint))
+        if limit > 0:
+            if count >= limit:
+                return
+            params['limit'] = min(page_size, limit - count)
+        else:
+            params['limit'] = page_size
+        params['offset'] = position
+
+        start = time.perf_counter()
+        try:
+            with _span(profiler, 'page'):
+                data = request(endpoint.function, params, priority='batch')
+        except Timeout:
+            if tuner is not None:
+                tuner.observe(endpoint, params['limit'], 0, time.perf_counter() - start, timeout=True)
+            if page_size <= endpoint.min_page_size:
+                raise
+            cap = max(endpoint.min_page_size, page_size // 2)
+            continue
+
+        total = data[endpoint.count_key]
+        page = data[endpoint.data_key]
+        if tuner is not None:
+            tuner.observe(endpoint, params['limit'], len(page), time.perf_counter() - start, connector.last_response_size())
+        if len(page) == 0:
+            return
+        # Server may deliver less than requested, so advance by what was received
+        position += len(page)
+        count += len(page)
+
+        if stop is not None:
+            for n, record in enumerate(page):
+                if stop(record):
+                    yield page[:n]
+                    return
+        yield page
+
+        cap = min(max_page_size, cap * 2)
+
+
+def _read_paged(connector, endpoint: Endpoint, params: dict, limit: int = 0, offset: int = 0, stop: callable = None, sink=None):
+    """
+    Reads all pages of a paginated endpoint into one list, see _iter_pages().
+    If a sink is given, every page is written to it instead and the count of records is returned.
+    """
+    profiler = getattr(connector, 'profiler', None)
+    if sink is not None:
+        count = 0
+        for page in _iter_pages(connector, endpoint, params, limit, offset, stop):
+            with _span(profiler, 'sink'):
+                sink.write(page)
+            count += len(page)
+        return count
+
+    result = []
+    for page in _iter_pages(connector, endpoint, params, limit, offset, stop):
+        with _span(profiler, 'collect'):
+            result.extend(page)
+    return result
+
+def _read_paged_many(connector, endpoint: Endpoint, params: dict, max_workers: int = 8, on_complete: callable = None,
+                     on_page: callable = None):
+    """
+    Reads a paginated endpoint for many parameter sets (e.g. one per ISIN) over one worker pool.
+    After the first page of a key has returned its total count, all remaining pages are requested at known offsets.
+    Pending pages are scheduled by their page number, so the first pages of all keys run before later pages
+    of large keys and no key blocks the others.
+
+    Parameters
+    ----------
+    connector : BF4PyConnector
+        Connector used for requests, its scheduler (if any) applies rate limits.
+    endpoint : Endpoint
+        Description of the endpoint.
+    params : dict
+        {key: request parameters without limit and offset}.
+    max_workers : int, optional
+        Number of concurrent requests. The default is 8.
+    on_complete : callable, optional
+        Called with key and list of records as soon as all pages of a key are read. Records are then not kept.
+    on_page : callable, optional
+        Called with key and list of records for every page, in order of offset. Without on_complete
+        only pages arriving ahead of their predecessors are kept in memory.
+
+    Returns
+    -------
+    result : dict
+        {key: list of records} or, if on_complete or on_page is given, {key: count of records}.
+
+    """
+    request = connector.data_request if endpoint.method == 'data' else connector.search_request
+    page_size = endpoint.max_page_size
+    # Heap of (page number, sequence, key, offset, limit)
+    queue = []
+    sequence = 0
+    pages = {key: {} for key in params}
+    missing = {key: 1 for key in params}
+    result = {}
+    # Records of pages not yet handed to on_page, and offset of the next page for on_page
+    keep = on_page is None or on_complete is not None
+    kept = {key: [] for key in params}
+    position = {key: 0 for key in params}
+    counts = {key: 0 for key in params}
+
+    def push(number, key, offset, limit):
+        nonlocal sequence
+        heapq.heappush(queue, (number, sequence, key, offset, limit))
+        sequence += 1
+        missing[key] += 1
+
+    def fetch(key, offset, limit):
+        return request(endpoint.function, dict(params[key], offset=offset, limit=limit), priority='batch')
+
+    for key in params:
+        heapq.heappush(queue, (0, sequence, key, 0, page_size))
+        sequence += 1
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        try:
+            while len(queue) > 0 or len(running) > 0:
+                while len(queue) > 0 and len(running) < max_workers:
+                    number, _, key, offset, limit = heapq.heappop(queue)
+                    running[executor.submit(fetch, key, offset, limit)] = (number, key, offset, limit)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number, key, offset, limit = running.pop(future)
+                    missing[key] -= 1
+                    try:
+                        data = future.result()
+                    except Timeout:
+                        if limit <= endpoint.min_page_size:
+                            raise
+                        # Split page into halves
+                        half = limit // 2
+                        push(number, key, offset, half)
+                        push(number, key, offset + half, limit - half)
+                        continue
+
+                    total = data[endpoint.count_key]
+                    page = data[endpoint.data_key]
+                    pages[key][offset] = page
+                    counts[key] += len(page)
+                    if on_page is not None:
+                        while position[key] in pages[key]:
+                            ready = pages[key].pop(position[key])
+                            if len(ready) == 0:
+                                break
+                            on_page(key, ready)
+                            if keep:
+                                kept[key].extend(ready)
+                            position[key] += len(ready)
+
+                    if number == 0 and offset == 0:
+                        for n, o in enumerate(range(page_size, total, page_size), 1):
+                            push(n, key, o, min(page_size, total - o))
+                    if 0 < len(page) < limit and offset + len(page) < total:
+                        # Server delivered less than requested, request the gap
+                        push(number, key, offset + len(page), limit - len(page))
+
+                    if missing[key] == 0:
+                        # Pages behind a gap (e.g. an empty page) were not handed out yet
+                        rest = [p for _, p in sorted(pages.pop(key).items()) if len(p) > 0]
+                        if on_page is not None:
+                            for p in rest:
+                                on_page(key, p)
+                        records = kept.pop(key) + [r for p in rest for r in p]
+                        if on_complete is not None:
+                            on_complete(key, records)
+                        if on_complete is not None or on_page is not None:
+                            result[key] = counts[key]
+                        else:
+                            result[key] = records
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return {key: result[key] for key in params}
 
 def _get_name(name_dict):
     name = name_dict['originalValue']
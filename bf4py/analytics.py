@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError('bf4py.analytics requires numpy, install it with: pip install bf4py[analytics]') from e
+
+
+TRADE_FIELDS = {'time': 'time', 'price': 'price', 'volume': 'turnover'}
+QUOTE_FIELDS = {'time': 'time', 'bid': 'bidPrice', 'ask': 'askPrice', 'bid_size': 'bidSize', 'ask_size': 'askSize'}
+
+
+def _timestamp(value):
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Naive timestamps are UTC like in bf4py.live_data, not local time
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def _timestamps(values):
+    # Epoch seconds, parsing is the only per-record Python step
+    missing = sum(1 for v in values if v is None)
+    if missing > 0:
+        raise ValueError(str(missing) + ' records without time, filter them before converting')
+    return np.fromiter((_timestamp(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def to_arrays(records: list, fields: dict, isin: str = None):
+    """
+    Converts a list of dicts into a dict of numpy arrays.
+
+    Parameters
+    ----------
+    records : list
+        List of dicts, e.g. result of Equities.times_sales().
+    fields : dict
+        Mapping of array name to record key, e.g. TRADE_FIELDS or QUOTE_FIELDS. Key 'time' is parsed into epoch seconds,
+        naive times are taken as UTC. Records without time raise ValueError.
+    isin : str, optional
+        If given, an array 'isin' with this value is added for group-bys.
+
+    Returns
+    -------
+    arrays : dict
+        Dict of numpy arrays sorted by time.
+
+    """
+    arrays = {}
+    for name, key in fields.items():
+        values = [r.get(key) for r in records]
+        if name == 'time':
+            arrays[name] = _timestamps(values)
+        else:
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if isin is not None:
+        arrays['isin'] = np.full(len(records), isin, dtype=object)
+
+    order = np.argsort(arrays['time'], kind='stable')
+    return {k: v[order] for k, v in arrays.items()}
+
+
+def concat(arrays: list):
+    """
+    Concatenates dicts of arrays (e.g. one per ISIN) into one dict of arrays.
+    """
+    return {k: np.concatenate([a[k] for a in arrays]) for k in arrays[0]}
+
+
+def asof_join(trade_time, quote_time, *quote_values, lag: float = 0., trade_keys=None, quote_keys=None):
+    """
+    For every trade returns the values of the latest quote at or before trade time minus lag.
+    Trades without prior quote get NaN. quote_time must be sorted unless keys are given.
+    With trade_keys and quote_keys (e.g. ISINs) trades are only joined to quotes of the same key.
+    """
+    trade_time = np.asarray(trade_time, dtype=np.float64)
+    quote_time = np.asarray(quote_time, dtype=np.float64)
+    quote_values = [np.asarray(v, dtype=np.float64) for v in quote_values]
+
+    if len(quote_time) == 0:
+        result = [np.full(len(trade_time), np.nan) for _ in quote_values]
+        return result if len(result) != 1 else result[0]
+
+    if trade_keys is not None:
+        # Shift every key into its own time range, so one searchsorted joins all keys at once
+        _, codes = np.unique(np.concatenate((np.asarray(trade_keys), np.asarray(quote_keys))), return_inverse=True)
+        trade_codes, quote_codes = codes[:len(trade_time)], codes[len(trade_time):]
+        start = min(trade_time.min(initial=np.inf), quote_time.min(initial=np.inf))
+        span = max(trade_time.max(initial=-np.inf), quote_time.max(initial=-np.inf)) - start + abs(lag) + 1.
+        trade_time = trade_time - start + trade_codes * span
+        quote_time = quote_time - start + quote_codes * span
+
+        order = np.argsort(quote_time, kind='stable')
+        quote_time = quote_time[order]
+        quote_codes = quote_codes[order]
+        quote_values = [v[order] for v in quote_values]
+
+    index = np.searchsorted(quote_time, trade_time - lag, side='right') - 1
+    valid = index >= 0
+    index = np.where(valid, index, 0)
+    if trade_keys is not None:
+        valid &= quote_codes[index] == trade_codes
+
+    result = [np.where(valid, v[index], np.nan) for v in quote_values]
+    return result if len(result) != 1 else result[0]
+
+
+def vwap(price, volume):
+    price = np.asarray(price, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    return np.nansum(price * volume) / np.nansum(volume)
+
+
+def log_returns(price):
+    return np.diff(np.log(np.asarray(price, dtype=np.float64)))
+
+
+def realized_volatility(price):
+    """
+    Square root of the sum of squared log returns.
+    """
+    return np.sqrt(np.nansum(log_returns(price) ** 2))
+
+
+def rolling(values, window: int, statistic: str = 'mean', chunk_size: int = 65536):
+    """
+    Rolling statistic over the last window values. Sum and mean are computed from cumulative sums of the
+    values minus their mean, std from the values of every window, which avoids cancellation errors.
+    The first window - 1 values and windows containing NaN are NaN.
+
+    Parameters
+    ----------
+    values : array
+        Input values.
+    window : int
+        Number of values per window.
+    statistic : str, optional
+        'sum', 'mean' or 'std'. The default is 'mean'.
+    chunk_size : int, optional
+        Number of windows evaluated at once for 'std', bounds the temporary memory. The default is 65536.
+
+    """
+    if statistic not in ('sum', 'mean', 'std'):
+        raise ValueError('Unknown statistic ' + str(statistic))
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if window > len(values):
+        return result
+
+    # NaN only invalidates the windows containing it, not every later window of the cumulative sum
+    missing = np.isnan(values)
+    c0 = np.concatenate(([0], np.cumsum(missing)))
+    incomplete = (c0[window:] - c0[:-window]) > 0
+    offset = np.mean(values[~missing]) if not missing.all() else 0.
+    filled = np.where(missing, offset, values) - offset
+
+    if statistic == 'std':
+        windows = np.lib.stride_tricks.sliding_window_view(filled, window)
+        out = result[window - 1:]
+        for start in range(0, len(windows), chunk_size):
+            out[start:start + chunk_size] = windows[start:start + chunk_size].std(axis=1)
+    else:
+        c1 = np.concatenate(([0.], np.cumsum(filled)))
+        s1 = c1[window:] - c1[:-window] + offset * window
+        result[window - 1:] = s1 if statistic == 'sum' else s1 / window
+
+    result[window - 1:][incomplete] = np.nan
+    return result
+
+
+def rolling_time_sum(time, values, seconds: float):
+    """
+    Sum of values within the last given seconds (including current value) for every element. time must be sorted.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    c = np.concatenate(([0.], np.cumsum(values)))
+    start = np.searchsorted(time, np.asarray(time) - seconds, side='right')
+    return c[1:] - c[start]
+
+
+def spread_statistics(bid, ask):
+    """
+    Returns dict with mean and median of absolute and relative (to mid) spreads.
+    """
+    bid = np.asarray(bid, dtype=np.float64)
+    ask = np.asarray(ask, dtype=np.float64)
+    valid = (bid > 0) & (ask >= bid)
+    spread = (ask - bid)[valid]
+    relative = spread / ((ask + bid)[valid] / 2)
+    return {'count': int(valid.sum()),
+            'mean': float(np.mean(spread)) if len(spread) else np.nan,
+            'median': float(np.median(spread)) if len(spread) else np.nan,
+            'mean_relative': float(np.mean(relative)) if len(spread) else np.nan,
+            'median_relative': float(np.median(relative)) if len(spread) else np.nan}
+
+
+def tick_test(price, keys=None):
+    """
+    Trade signs by tick test: +1 for an uptick, -1 for a downtick, zero ticks inherit the previous sign.
+    If keys are given, data must be sorted by key and time, the test restarts for every key.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    sign = np.zeros(len(price))
+    sign[1:] = np.sign(np.diff(price))
+    if keys is not None:
+        keys = np.asarray(keys)
+        sign[1:][keys[1:] != keys[:-1]] = 0
+
+    # Forward fill zero ticks with the last non-zero sign
+    index = np.where(sign != 0, np.arange(len(sign)), 0)
+    if keys is not None:
+        # Do not fill across keys: first element of every key starts a new run
+        first = np.ones(len(sign), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        index = np.where(first & (sign == 0), np.arange(len(sign)), index)
+    np.maximum.accumulate(index, out=index)
+    return sign[index]
+
+
+def lee_ready(trade_time, price, quote_time, bid, ask, lag: float = 0., trade_keys=None, quote_keys=None):
+    """
+    Classifies trades by the Lee-Ready algorithm: trades above the prevailing mid quote are buys (+1),
+    below are sells (-1), trades at the mid or without quote are classified by the tick test.
+    For several ISINs pass trade_keys and quote_keys, trades must then be sorted by key and time.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    quote_bid, quote_ask = asof_join(trade_time, quote_time, bid, ask, lag=lag, trade_keys=trade_keys, quote_keys=quote_keys)
+    mid = (quote_bid + quote_ask) / 2
+
+    sign = np.sign(price - mid)
+    undecided = (sign == 0) | np.isnan(sign)
+    return np.where(undecided, tick_test(price, trade_keys), sign)
+
+
+def group_by(keys, values, statistic: str = 'sum'):
+    """
+    Aggregates values per key (e.g. ISIN).
+
+    Parameters
+    ----------
+    keys : array
+        Group key per value.
+    values : array
+        Values to aggregate.
+    statistic : str, optional
+        'sum', 'mean' or 'count'. The default is 'sum'.
+
+    Returns
+    -------
+    result : dict
+        {key: aggregate}
+
+    """
+    groups, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.bincount(inverse, minlength=len(groups))
+
+    if statistic == 'count':
+        result = counts
+    elif statistic == 'sum':
+        result = np.bincount(inverse, weights=values, minlength=len(groups))
+    elif statistic == 'mean':
+        result = np.bincount(inverse, weights=values, minlength=len(groups)) / counts
+    else:
+        raise ValueError('Unknown statistic ' + str(statistic))
+    return dict(zip(groups.tolist(), result.tolist()))
+
+
+def vwap_by(keys, price, volume):
+    """
+    VWAP per key (e.g. ISIN).
+    """
+    price = np.asarray(price, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    turnover = group_by(keys, price * volume)
+    pieces = group_by(keys, volume)
+    return {k: turnover[k] / pieces[k] if pieces[k] else np.nan for k in turnover}
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, shutil
+import time as _time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta, timezone
+
+from .connector import BF4PyConnector, get_connector
+from .derivatives import Derivatives
+from ._columnar import write_partition, read_partition, read_partition_records
+
+
+class TradeHistoryBackfill():
+    """
+    Fetches derivatives trade history for a range of days. Every day is split into time windows
+    which are fetched concurrently, each completed day is written as compressed columnar partition.
+    Completed windows of unfinished days are stored as well, so a rerun only fetches what is missing.
+    """
+    def __init__(self, path: str, connector: BF4PyConnector = None, max_workers: int = 8, windows: int = 7,
+                 start_time: time = time(8,0,0), end_time: time = time(22,0,0), retries: int = 3,
+                 retry_delay: float = 1., time_key: str = 'time'):
+        """
+        Parameters
+        ----------
+        path : str
+            Directory for the day partitions.
+        connector : BF4PyConnector, optional
+            Connector to use.
+        max_workers : int, optional
+            Number of concurrently fetched windows. The default is 8.
+        windows : int, optional
+            Number of time windows per day. The default is 7 (two hours each).
+        start_time : time, optional
+            Local start time of trading. The default is 08:00.
+        end_time : time, optional
+            Local end time of trading. The default is 22:00.
+        retries : int, optional
+            Number of retries of a failed window, with exponentially growing delay. The default is 3.
+        retry_delay : float, optional
+            Seconds before the first retry. The default is 1.
+        time_key : str, optional
+            Key of the trade timestamp, used to assign trades on a window boundary. The default is 'time'.
+
+        """
+        self.path = path
+        self.max_workers = max_workers
+        self.windows = windows
+        self.start_time = start_time
+        self.end_time = end_time
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.time_key = time_key
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        self.derivatives = Derivatives(self.connector)
+
+    def partition_path(self, day: date):
+        return os.path.join(self.path, day.isoformat() + '.json.gz')
+
+    def _window_path(self, day: date, window: int):
+        return os.path.join(self.path, day.isoformat() + '.windows', str(window) + '-of-' + str(self.windows) + '.json.gz')
+
+    def completed_days(self):
+        """
+        Returns sorted list of days with a complete partition.
+        """
+        days = []
+        for f in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if f.endswith('.json.gz'):
+                days.append(date.fromisoformat(f[:-len('.json.gz')]))
+        return sorted(days)
+
+    def load(self, day: date, columns: list = None):
+        """
+        Returns the stored trades of given day as dict of lists (columns) or as list of dicts if columns is 'records'.
+        """
+        if columns == 'records':
+            return read_partition_records(self.partition_path(day))
+        return read_partition(self.partition_path(day), columns)
+
+    def _split_day(self, day: date):
+        start = datetime.combine(day, self.start_time)
+        end = datetime.combine(day, self.end_time)
+        step = (end - start) / self.windows
+
+        windows = []
+        for i in range(self.windows):
+            w_start = start + step * i
+            w_end = end if i == self.windows - 1 else start + step * (i + 1)
+            windows.append((w_start, w_end))
+        return windows
+
+    def _before(self, trade, end):
+        value = trade.get(self.time_key)
+        if not isinstance(value, str):
+            return True
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp < end
+
+    def _fetch_window(self, day, window, w_start, w_end, last):
+        for attempt in range(self.retries + 1):
+            try:
+                trades = self.derivatives.trade_history(day, w_start.time(), w_end.time())
+                break
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                _time.sleep(self.retry_delay * 2 ** attempt)
+
+        # Windows are half-open [start, end), the API includes the end, so trades on the boundary belong to the next window
+        if not last:
+            end = w_end.astimezone(timezone.utc)
+            trades = [t for t in trades if self._before(t, end)]
+
+        write_partition(self._window_path(day, window), trades, {'day': day.isoformat(), 'window': window})
+        return trades
+
+    def run(self, start: date, end: date, weekends: bool = False, progress: callable = print):
+        """
+        Fetches all missing days between start and end (both inclusive).
+
+        Parameters
+        ----------
+        start : date
+            First day.
+        end : date
+            Last day.
+        weekends : bool, optional
+            Also fetch saturdays and sundays. The default is False.
+        progress : callable, optional
+            Called with a dict after every completed day. The default is print, use None to disable.
+
+        Returns
+        -------
+        stats : dict
+            Days fetched and skipped, records, records per second and list of (day, window, error)
+            of windows which failed after all retries. Rerun to fetch these.
+
+        """
+        days = []
+        day = start
+        while day <= end:
+            if weekends or day.weekday() < 5:
+                days.append(day)
+            day += timedelta(days=1)
+
+        todo = [d for d in days if not os.path.exists(self.partition_path(d))]
+        stats = {'days': len(todo), 'skipped': len(days) - len(todo), 'completed': 0, 'records': 0,
+                 'seconds': 0., 'records_per_second': 0., 'failed': []}
+
+        pending = {}
+        t0 = _time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for d in todo:
+                windows = self._split_day(d)
+                pending[d] = [None] * len(windows)
+                for i, (w_start, w_end) in enumerate(windows):
+                    # Windows stored by an interrupted run are not fetched again
+                    if os.path.exists(self._window_path(d, i)):
+                        pending[d][i] = read_partition_records(self._window_path(d, i))
+                        continue
+                    future = executor.submit(self._fetch_window, d, i, w_start, w_end, i == len(windows) - 1)
+                    futures[future] = (d, i)
+
+            def complete(d):
+                records = [t for w in pending.pop(d) for t in w]
+                write_partition(self.partition_path(d), records, {'day': d.isoformat(), 'endpoint': 'derivatives_trade_history'})
+                shutil.rmtree(os.path.join(self.path, d.isoformat() + '.windows'), ignore_errors=True)
+
+                stats['completed'] += 1
+                stats['records'] += len(records)
+                stats['seconds'] = _time.monotonic() - t0
+                stats['records_per_second'] = stats['records'] / stats['seconds'] if stats['seconds'] > 0 else 0.
+                if progress is not None:
+                    progress(dict(stats, day=d.isoformat(), day_records=len(records)))
+
+            # Days completely restored from stored windows
+            for d in [d for d in todo if all(w is not None for w in pending[d])]:
+                complete(d)
+
+            for future in as_completed(futures):
+                d, i = futures[future]
+                try:
+                    pending[d][i] = future.result()
+                except Exception as e:
+                    # Completed windows are stored, a rerun continues with the failed ones
+                    stats['failed'].append((d.isoformat(), i, repr(e)))
+                    continue
+                if all(w is not None for w in pending[d]):
+                    complete(d)
+
+        return stats
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
+from ._utils import _read_paged, BOND_SEARCH
 from datetime import date, datetime, timezone, time
 
 class Bonds():
@@ -10,7 +11,7 @@ class Bonds():
         self.default_mic = default_mic
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
 
@@ -115,7 +116,7 @@ class Bonds():
         return params
     
     
-    def search(self, params):
+    def search(self, params, sink=None):
         """
         Searches for bonds using specified parameters.
 
@@ -124,6 +125,8 @@ class Bonds():
         params : dict
             Dict with parameters for bond search. Use search_parameter_template() to get a params template.
             Note that providing a parameter that is not intended for the bond type may lead to empty results.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
 
         Returns
         -------
@@ -131,21 +134,6 @@ class Bonds():
             Returns a list of bonds matching the search criterias.
 
         """
-        CHUNK_SIZE = 1000
-        i = 0
-        maxCount = CHUNK_SIZE + 1
-        params['limit'] = CHUNK_SIZE
-        
-        bonds_list = []
-        
-        while i * CHUNK_SIZE < maxCount:
-            params['offset'] = i * CHUNK_SIZE
-            
-            data = self.connector.search_request('bond_search', params)
-            
-            maxCount = data['recordsTotal']
-            bonds_list += data['data']
-            
-            i += 1
+        bonds_list = _read_paged(self.connector, BOND_SEARCH, params, sink=sink)
         
         return bonds_list
\ No newline at end of file
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, json, os, struct, tempfile, threading, time
+
+_MAGIC = b'BF4PYCAP'
+_VERSION = 1
+_FILE_HEADER = struct.Struct('<8sH')
+# receive timestamp (epoch seconds), channel id, payload length
+_RECORD_HEADER = struct.Struct('<dHI')
+_CHANNEL_DEFINITION = 0
+
+
+class CaptureWriter():
+    """
+    Append-only capture file for stream events. Every record holds the receive timestamp,
+    a channel id (endpoint and parameters) and the raw JSON payload, prefixed by its length.
+    The file is flushed every flush_interval seconds, so an interrupted capture keeps its records up to then.
+    A truncated record at the end of such a capture is removed when the file is opened for appending.
+    """
+    def __init__(self, path: str, compress: bool = None, flush_interval: float = 1.):
+        self.path = path
+        if compress is None:
+            compress = path.endswith('.gz')
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.channels = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            if _is_gzip(path) != compress:
+                raise ValueError('Existing capture ' + path + (' is ' if compress else ' is not ') +
+                                 'a plain file, open it with compress=' + str(not compress))
+            self._read_channels()
+
+        if compress:
+            # Appending a new gzip member keeps existing captures readable
+            self.file = gzip.open(path, 'ab', compresslevel=1)
+        else:
+            self.file = open(path, 'ab')
+
+        if is_new:
+            self.file.write(_FILE_HEADER.pack(_MAGIC, _VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def channel(self, endpoint: str, params: dict):
+        """
+        Returns the channel id for given endpoint and parameters, registering it if necessary.
+        Returns None for a new channel after the writer was closed.
+        """
+        key = (endpoint, json.dumps(params, sort_keys=True))
+        with self._lock:
+            if key not in self.channels:
+                if self.file.closed:
+                    return None
+                channel_id = len(self.channels) + 1
+                definition = json.dumps({'channel': channel_id, 'endpoint': endpoint, 'params': params}).encode()
+                self.file.write(_RECORD_HEADER.pack(time.time(), _CHANNEL_DEFINITION, len(definition)))
+                self.file.write(definition)
+                self.channels[key] = channel_id
+            return self.channels[key]
+
+    def write(self, channel_id: int, payload: bytes, received: float = None):
+        """
+        Appends one raw event payload to the capture.
+        """
+        if received is None:
+            received = time.time()
+        with self._lock:
+            if channel_id is None or self.file.closed:
+                return
+            self.file.write(_RECORD_HEADER.pack(received, channel_id, len(payload)))
+            self.file.write(payload)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.file.flush()
+                self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if not self.file.closed:
+                self.file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def _read_channels(self):
+        reader = CaptureReader(self.path)
+        for channel_id, endpoint, params in reader.channels():
+            self.channels[(endpoint, json.dumps(params, sort_keys=True))] = channel_id
+        if reader.truncated:
+            self._repair(reader)
+
+    def _repair(self, reader):
+        # Appended records would be read as part of the truncated one, so the file is cut to complete records
+        if not self.compress:
+            os.truncate(self.path, reader.complete_size)
+            return
+        # A gzip member cannot be cut, the complete records are compressed into a new file
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        os.close(fd)
+        with gzip.open(tmp_file, 'wb', compresslevel=1) as f:
+            f.write(_FILE_HEADER.pack(_MAGIC, _VERSION))
+            for received, channel_id, payload in reader._raw_records():
+                f.write(_RECORD_HEADER.pack(received, channel_id, len(payload)))
+                f.write(payload)
+        os.replace(tmp_file, self.path)
+
+
+def _is_gzip(path):
+    with open(path, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+class CaptureReader():
+    """
+    Reads a capture file. Reading stops at a truncated record of an interrupted capture (plain or gzip),
+    truncated is then True and complete_size the uncompressed size up to the last complete record.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.truncated = False
+        self.complete_size = 0
+
+    def __iter__(self):
+        return self.records()
+
+    def _open(self):
+        return gzip.open(self.path, 'rb') if _is_gzip(self.path) else open(self.path, 'rb')
+
+    @staticmethod
+    def _read(f, size):
+        # A gzip stream of an interrupted capture lacks its end marker, which is just another truncation
+        try:
+            return f.read(size)
+        except EOFError:
+            return b''
+
+    def _raw_records(self):
+        self.truncated = False
+        with self._open() as f:
+            magic, version = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+            if magic != _MAGIC:
+                raise Exception('Not a bf4py capture file: ' + self.path)
+            if version != _VERSION:
+                raise Exception('Unsupported capture version ' + str(version))
+            self.complete_size = _FILE_HEADER.size
+
+            while True:
+                header = self._read(f, _RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    # End of file or truncated record of an interrupted capture
+                    self.truncated = len(header) > 0 or not self._at_end(f)
+                    return
+                received, channel_id, length = _RECORD_HEADER.unpack(header)
+                payload = self._read(f, length)
+                if len(payload) < length:
+                    self.truncated = True
+                    return
+                self.complete_size += _RECORD_HEADER.size + length
+                yield received, channel_id, payload
+
+    def _at_end(self, f):
+        # Plain files end cleanly here, gzip streams only if their end marker was written
+        if not isinstance(f, gzip.GzipFile):
+            return True
+        try:
+            f.read(1)
+        except EOFError:
+            return False
+        return True
+
+    def channels(self):
+        """
+        Yields tuples (channel id, endpoint, params) of all channels in the capture.
+        """
+        for _, channel_id, payload in self._raw_records():
+            if channel_id == _CHANNEL_DEFINITION:
+                definition = json.loads(payload)
+                yield definition['channel'], definition['endpoint'], definition['params']
+
+    def records(self):
+        """
+        Yields tuples (receive timestamp, endpoint, params, raw payload) for every captured event.
+        """
+        channels = {}
+        for received, channel_id, payload in self._raw_records():
+            if channel_id == _CHANNEL_DEFINITION:
+                definition = json.loads(payload)
+                channels[definition['channel']] = (definition['endpoint'], definition['params'])
+            else:
+                endpoint, params = channels[channel_id]
+                yield received, endpoint, params, payload
+
+
+def replay(path: str, callback: callable = print, speed: float = 1.0, endpoint: str = None, isin: str = None):
+    """
+    Replays a capture file through a callback like BFStreamClient does.
+
+    Parameters
+    ----------
+    path : str
+        Capture file written by CaptureWriter.
+    callback : callable, optional
+        Callback function to evaluate data. It will get one argument containing JSON data. The default is print.
+    speed : float, optional
+        Replay speed relative to the original timing, e.g. 10 for ten times faster. None or 0 replays as fast as possible. The default is 1.0.
+    endpoint : str, optional
+        Replay only events of given endpoint. The default is None (=all).
+    isin : str, optional
+        Replay only events of given ISIN. The default is None (=all).
+
+    Returns
+    -------
+    count : int
+        Number of replayed events.
+
+    """
+    assert speed is None or speed >= 0, 'Replay speed must not be negative'
+
+    count = 0
+    start_received = None
+    start_clock = None
+
+    for received, ep, params, payload in CaptureReader(path):
+        if endpoint is not None and ep != endpoint:
+            continue
+        if isin is not None and params.get('isin') != isin:
+            continue
+
+        if speed:
+            if start_received is None:
+                start_received = received
+                start_clock = time.monotonic()
+            wait = (received - start_received) / speed - (time.monotonic() - start_clock)
+            if wait > 0:
+                time.sleep(wait)
+
+        callback(json.loads(payload))
+        count += 1
+
+    return count
@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
 
 class Company():
     def __init__(self, connector: BF4PyConnector = None, default_isin = None):
         self.default_isin = default_isin
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
     
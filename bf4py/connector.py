@@ -1,118 +1,403 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-class BF4PyConnector():
-    def __init__(self, salt: str=None):
-        import requests, re
+import hashlib, json, os, re, tempfile, threading, time, weakref
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+import requests
+
+from .profiling import _span
+from ._sse import SSEStream
+
+
+class _RequestSigner():
+    """
+    Creates the tracing headers for requests. The x-security digest only depends on the local minute
+    and the date prefix only on the second, so both are computed once and reused. Cached values are
+    replaced as whole tuples, which keeps the signer thread-safe without locking.
+    """
+    def __init__(self, salt: str):
+        self.salt = salt.encode()
+        self._second = (None, None)
+        self._minute = (None, None)
+    
+    def sign(self, url: str):
+        now = time.time()
+        millis = int(now * 1000)
+        second = millis // 1000
         
-        self.session = requests.Session()
+        cached_second, prefix = self._second
+        if cached_second != second:
+            prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+            self._second = (second, prefix)
+        timestr = '%s.%03dZ' % (prefix, millis % 1000)
+        
+        # Salt is appended to the traced string, so no hash state can be shared between requests
+        traceid = hashlib.md5(timestr.encode() + url.encode() + self.salt).hexdigest()
         
+        minute = second // 60
+        cached_minute, xsecurity = self._minute
+        if cached_minute != minute:
+            xsecurity = hashlib.md5(time.strftime('%Y%m%d%H%M', time.localtime(second)).encode()).hexdigest()
+            self._minute = (minute, xsecurity)
+        
+        return {'client-date':timestr, 'x-client-traceid':traceid, 'x-security':xsecurity}
+
+
+class _SingleFlight():
+    """
+    Lets concurrent identical calls share one execution. The first caller of a key runs the
+    function, callers arriving while it runs wait and get the same result (or exception).
+    """
+    class _Call():
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key, function: callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _SingleFlight._Call()
+        
+        if leader:
+            try:
+                call.result = function()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+DEFAULT_SALT_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'bf4py', 'salt.json')
+# Seconds a discovered salt is shared via the salt cache file
+SALT_CACHE_TTL = 6 * 3600
+
+# All connectors of this process, rebuilt in forked children
+_connectors = weakref.WeakSet()
+
+
+class BF4PyConnector():
+    def __init__(self, salt: str=None, coalesce: bool=True, scheduler=None, salt_cache: str=DEFAULT_SALT_CACHE):
+        """
+        Parameters
+        ----------
+        salt : str, optional
+            Tracing salt. The default is None (=discovered from boerse-frankfurt.de on first request).
+        coalesce : bool, optional
+            Concurrent identical data/search requests of the same priority class share one network call,
+            every caller decodes its own copy of the response. The default is True.
+        scheduler : RequestScheduler, optional
+            Admits requests by priority class, see bf4py.scheduler. The default is None (=no scheduling).
+        salt_cache : str, optional
+            File sharing the discovered salt between processes for SALT_CACHE_TTL seconds.
+            The default is ~/.cache/bf4py/salt.json, None disables the cache.
+
+        """
+        self.coalesce = coalesce
+        self.scheduler = scheduler
+        self.salt_cache = salt_cache
+        # Optional PageSizeTuner used by paginated requests, shared by all facades using this connector
+        self.page_tuner = None
+        # Optional Profiler recording network and decode spans outside of instrumented calls
+        self.profiler = None
+ 
+        # Salt is discovered on first request, so creating a connector does no network I/O
+        self._salt = salt
+        self._salt_discovered = False
+        self._signer = None
+        self._reset()
+        _connectors.add(self)
+    
+    def _reset(self):
+        # Per-process state: session with its connection pool, locks and in-flight calls
+        self._pid = os.getpid()
+        self.session = requests.Session()
         self.session.headers.update({'authority': 'api.live.deutsche-boerse.com', 
 							         'origin': 'https://live.deutsche-boerse.com',
 							         'referer': 'https://live.deutsche-boerse.com/',})
-        
+        self._single_flight = _SingleFlight()
+        self._salt_lock = threading.Lock()
+        self._local = threading.local()
+    
+    def _after_fork(self):
+        # The inherited session shares its sockets with the parent, so it is dropped without closing
+        self._reset()
+        for component in (self.scheduler, self.page_tuner, self.profiler):
+            if hasattr(component, '_after_fork'):
+                component._after_fork()
+    
+    def _check_process(self):
+        # Fallback for forks not reported by os.register_at_fork (e.g. on platforms without it)
+        if self._pid != os.getpid():
+            self._after_fork()
+    
+    @property
+    def salt(self):
+        if self._salt is None:
+            with self._salt_lock:
+                if self._salt is None:
+                    self._salt = self._discover_salt()
+                    self._salt_discovered = True
+        return self._salt
+    
+    @salt.setter
+    def salt(self, value):
+        self._salt = value
+        self._salt_discovered = False
+        self._signer = None
+    
+    def _invalidate_salt(self, salt: str):
+        # Drops a discovered salt rejected by the server from memory and cache file, so the next request
+        # discovers it again. Returns False for a salt given by the user or already replaced by another thread.
+        with self._salt_lock:
+            if not self._salt_discovered or self._salt != salt:
+                return False
+            self._salt = None
+            self._salt_discovered = False
+            self._signer = None
+            if self._read_salt_cache() == salt:
+                try:
+                    os.remove(self.salt_cache)
+                except OSError:
+                    pass
+        return True
+    
+    def _discover_salt(self):
+        salt = self._read_salt_cache()
         if salt is None:
-            # Step 1: Get Homepage and extract main-es2015 Javascript file
-            response = self.session.get('https://www.boerse-frankfurt.de/')
-            if response.status_code != 200:
-                raise Exception('Could not connect to boerse-frankfurt.de')
-            file = re.findall(r'(?<=src=")main\.\w*\.js', response.text)
-            if len(file) != 1:
-                raise Exception('Could not find ECMA Script name')
-            
-            # Step 2: Get Javascript file and extract salt
-            response = self.session.get('https://www.boerse-frankfurt.de/'+file[0])
-            if response.status_code != 200:
-                raise Exception('Could not connect to boerse-frankfurt.de')
-            salt_list = re.findall(r'(?<=salt:")\w*', response.text)
-            if len(salt_list) != 1:
-                raise Exception('Could not find tracing-salt')
-            self.salt = salt_list[0]
-        else:
-            self.salt = salt
+            salt = self._fetch_salt()
+            self._write_salt_cache(salt)
+        return salt
+    
+    def _read_salt_cache(self):
+        if self.salt_cache is None:
+            return None
+        try:
+            with open(self.salt_cache, 'r') as f:
+                cache = json.load(f)
+            if time.time() - cache['time'] < SALT_CACHE_TTL:
+                return cache['salt']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+    
+    def _write_salt_cache(self, salt):
+        if self.salt_cache is None:
+            return
+        try:
+            directory = os.path.dirname(self.salt_cache) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'salt': salt, 'time': time.time()}, f)
+            os.replace(tmp_file, self.salt_cache)
+        except OSError:
+            pass
+    
+    def _fetch_salt(self):
+        # Step 1: Get Homepage and extract main-es2015 Javascript file
+        response = self.session.get('https://www.boerse-frankfurt.de/')
+        if response.status_code != 200:
+            raise Exception('Could not connect to boerse-frankfurt.de')
+        file = re.findall(r'(?<=src=")main\.\w*\.js', response.text)
+        if len(file) != 1:
+            raise Exception('Could not find ECMA Script name')
+        
+        # Step 2: Get Javascript file and extract salt
+        response = self.session.get('https://www.boerse-frankfurt.de/'+file[0])
+        if response.status_code != 200:
+            raise Exception('Could not connect to boerse-frankfurt.de')
+        salt_list = re.findall(r'(?<=salt:")\w*', response.text)
+        if len(salt_list) != 1:
+            raise Exception('Could not find tracing-salt')
+        return salt_list[0]
    
     def __del__(self):
         self.session.close()
    
+    def _get_signer(self):
+        signer = self._signer
+        if signer is None:
+            signer = self._signer = _RequestSigner(self.salt)
+        return signer
+    
     def _create_ids(self, url):
-        import hashlib
-        from datetime import datetime
-        timeutc = datetime.utcnow()
-        timelocal = datetime.now()
-        timestr = timeutc.isoformat(timespec='milliseconds') + 'Z'
-
-        traceidbase = timestr + url + self.salt
-        encoded = traceidbase.encode()
-        traceid = hashlib.md5(encoded).hexdigest()
-
-        xsecuritybase = timelocal.strftime("%Y%m%d%H%M") 
-        encoded = xsecuritybase.encode()
-        xsecurity = hashlib.md5(encoded).hexdigest()
-        
-        return {'client-date':timestr, 'x-client-traceid':traceid, 'x-security':xsecurity}
+        return self._get_signer().sign(url)
     
     
     
     def _get_data_url(self, function: str, params:dict):
-        import urllib
         baseurl = "https://api.boerse-frankfurt.de/v1/data/"
-        p_string = urllib.parse.urlencode(params)
+        p_string = urlencode(params)
         return baseurl + function + '?' + p_string
 
     
-    def data_request(self, function: str, params: dict):
-        import json
+    @contextmanager
+    def priority(self, name: str):
+        """
+        Sets the scheduler priority class of all requests of the calling thread within the with-block,
+        e.g. with connector.priority('interactive'): ...
+        This overrides the class 'batch' used by paginated requests.
+        """
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = name
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+    
+    def _priority(self, priority):
+        # Class set by priority() for the calling thread overrides the class given by the caller
+        return getattr(self._local, 'priority', None) or priority
+    
+    def _send(self, priority, send: callable):
+        if self.scheduler is None:
+            return send()
+        with self.scheduler.slot(priority):
+            return send()
+    
+    def _send_signed(self, url, priority, send: callable):
+        # send gets the signed headers. A request rejected as unauthorized is retried once with a rediscovered
+        # salt, as a cached salt may be outdated by a new release of the website.
+        def signed():
+            # Sign after admission, so tracing timestamps are not outdated by waiting in the scheduler
+            signer = self._get_signer()
+            return signer, send(signer.sign(url))
         
-        url = self._get_data_url(function, params)
-        header = self._create_ids(url)
-        header['accept'] = 'application/json, text/plain, */*'
-        req = self.session.get(url, headers=header, timeout=(3.5, 15))
+        signer, response = self._send(priority, signed)
+        if response.status_code in (401, 403) and self._invalidate_salt(signer.salt.decode()):
+            signer, response = self._send(priority, signed)
+        return response
+    
+    def _fetch(self, method, function, params, priority, fetch: callable):
+        # Returns the response text; concurrent identical requests share it, but every caller decodes on its own
+        self._check_process()
+        priority = self._priority(priority)
+        if self.coalesce:
+            key = (method, function, json.dumps(params, sort_keys=True, default=str), priority)
+            text, size = self._single_flight.do(key, lambda: fetch(priority))
+        else:
+            text, size = fetch(priority)
+        self._local.response_size = size
+        return text
+    
+    def data_request(self, function: str, params: dict, priority: str=None):
+        text = self._fetch('data', function, params, priority, lambda p: self._data_request(function, params, p))
         
-        if req.text is None:
+        if text is None:
             raise Exception('Boerse Frankfurt returned no data, check parameters, especially period!')
         
-        data = json.loads(req.text)
+        with _span(self.profiler, 'decode'):
+            data = json.loads(text)
         
         if 'messages' in data:
             raise Exception('Boerse Frankfurt did not process request:', *data['messages'])
         
         return data
     
+    def _data_request(self, function: str, params: dict, priority: str=None):
+        url = self._get_data_url(function, params)
+        
+        def send(header):
+            header['accept'] = 'application/json, text/plain, */*'
+            return self.session.get(url, headers=header, timeout=(3.5, 15))
+        
+        with _span(self.profiler, 'network'):
+            req = self._send_signed(url, priority, send)
+        return req.text, len(req.content)
+    
+    def last_response_size(self):
+        """
+        Returns size in bytes of the last response received by the calling thread.
+        """
+        return getattr(self._local, 'response_size', None)
+    
     def _get_search_url(self, function: str, params:dict):
-        import urllib
         baseurl = "https://api.boerse-frankfurt.de/v1/search/"
-        p_string = urllib.parse.urlencode(params)
+        p_string = urlencode(params)
         return baseurl + function + ('?' + p_string if p_string != '' else '')
 
-    def search_request(self, function: str, params: dict):
-        import json
+    def search_request(self, function: str, params: dict, priority: str=None):
+        text = self._fetch('search', function, params, priority, lambda p: self._search_request(function, params, p))
         
-        url = self._get_search_url(function, {})
-        header = self._create_ids(url)
-        header['accept'] = 'application/json, text/plain, */*'
-        header['content-type'] = 'application/json; charset=UTF-8'
-        req = self.session.post(url, headers=header, timeout=(3.5, 15), json=params)
-
         try:
-            data = json.loads(req.text)
+            with _span(self.profiler, 'decode'):
+                data = json.loads(text)
         except:
-            print(req.text)
+            print(text)
             raise Exception('Boerse Frankfurt returned no data, check parameters!')
         
         return data
+    
+    def _search_request(self, function: str, params: dict, priority: str=None):
+        url = self._get_search_url(function, {})
+        
+        def send(header):
+            header['accept'] = 'application/json, text/plain, */*'
+            header['content-type'] = 'application/json; charset=UTF-8'
+            return self.session.post(url, headers=header, timeout=(3.5, 15), json=params)
+        
+        with _span(self.profiler, 'network'):
+            req = self._send_signed(url, priority, send)
+        return req.text, len(req.content)
 
     # Functions for STREAM requests
 
     def stream_request(self, function: str, params: dict):
-        import sseclient, requests
-        
+        self._check_process()
         url = self._get_data_url(function, params)
         header = self._create_ids(url)
         header['accept'] = 'text/event-stream'
         header['cache-control'] = 'no-cache, no-store, must-revalidate, max-age=0'
         
         socket = requests.get(url, stream=True, headers=header, timeout=(3.5, 5))
-        client = sseclient.SSEClient(socket)
+        client = SSEStream(socket)
         
         return client
     
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_connector(**config):
+    """
+    Returns the process-wide shared connector for given configuration (keyword arguments of BF4PyConnector),
+    creating it on first use. Facades and stream clients created without connector use get_connector().
+    Attributes like page_tuner are therefore shared by all of them, create a BF4PyConnector to tune separately.
+    """
+    key = tuple(sorted(config.items()))
+    with _registry_lock:
+        connector = _registry.get(key)
+        if connector is None:
+            connector = _registry[key] = BF4PyConnector(**config)
+    return connector
+
+
+def _after_fork_in_child():
+    # Locks may have been held by other threads of the parent at fork time
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    for connector in list(_connectors):
+        connector._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, mmap, os, sqlite3, struct, tempfile, time
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+_MAGIC = b'BF4PYMM1'
+_HEADER = struct.Struct('<8sI')
+_ALIGN = 8
+
+
+def _column_type(values):
+    kinds = set(type(v) for v in values if v is not None)
+    if len(kinds) == 0 or kinds <= {int, float}:
+        if kinds == {int} and all(v is not None for v in values):
+            return 'i8'
+        return 'f8'
+    if kinds == {str}:
+        return 'str'
+    return 'json'
+
+
+def _encode_column(values, kind):
+    if kind == 'i8':
+        return array('q', values).tobytes()
+    if kind == 'f8':
+        return array('d', (float('nan') if v is None else v for v in values)).tobytes()
+
+    if kind == 'str':
+        encoded = [b'' if v is None else v.encode() for v in values]
+    else:
+        encoded = [json.dumps(v).encode() for v in values]
+    offsets = array('q', [0])
+    position = 0
+    for e in encoded:
+        position += len(e)
+        offsets.append(position)
+    # Offsets first (n + 1 int64), followed by the utf-8 blob
+    return offsets.tobytes() + b''.join(encoded)
+
+
+def write_dataset(path: str, records: list, meta: dict = None):
+    """
+    Writes records (list of dicts) as memory-mappable columnar file. Numbers are stored as
+    int64/float64 arrays, strings as offsets plus utf-8 blob, everything else as JSON strings.
+    The file is replaced atomically.
+    """
+    names = []
+    for r in records:
+        for k in r:
+            if k not in names:
+                names.append(k)
+
+    columns = []
+    blocks = []
+    position = 0
+    for name in names:
+        values = [r.get(name) for r in records]
+        kind = _column_type(values)
+        block = _encode_column(values, kind)
+        padding = (-len(block)) % _ALIGN
+        columns.append({'name': name, 'type': kind, 'offset': position, 'length': len(block)})
+        blocks.append(block + b'\0' * padding)
+        position += len(block) + padding
+
+    header = json.dumps({'rows': len(records), 'meta': meta if meta is not None else {}, 'columns': columns}).encode()
+    header += b' ' * ((-(_HEADER.size + len(header))) % _ALIGN)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(header)))
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_file, path)
+
+
+class _StringColumn():
+    """
+    Read-only sequence over a string (or JSON) column, values are decoded on access.
+    """
+    def __init__(self, view, rows, kind):
+        self.offsets = view[:(rows + 1) * 8].cast('q')
+        self.blob = view[(rows + 1) * 8:]
+        self.rows = rows
+        self.kind = kind
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.rows))]
+        if i < 0:
+            i += self.rows
+        value = bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+        return json.loads(value) if self.kind == 'json' else value
+
+    def __iter__(self):
+        for i in range(self.rows):
+            yield self[i]
+
+
+class MappedDataset():
+    """
+    Read-only, memory-mapped dataset written by write_dataset(). Numeric columns are returned as
+    memoryviews on the mapped file, so processes opening the same file share its pages via the OS page cache.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, header_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise Exception('Not a bf4py dataset: ' + path)
+        header = json.loads(bytes(self._view[_HEADER.size:_HEADER.size + header_length]))
+        self._data_offset = _HEADER.size + header_length
+
+        self.rows = header['rows']
+        self.meta = header['meta']
+        self.columns = {c['name']: c for c in header['columns']}
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def column(self, name: str):
+        """
+        Returns a column without copying: memoryview of int64/float64 values for numeric columns,
+        a lazily decoding sequence for string columns.
+        """
+        c = self.columns[name]
+        start = self._data_offset + c['offset']
+        view = self._view[start:start + c['length']]
+        if c['type'] == 'i8':
+            return view.cast('q')
+        if c['type'] == 'f8':
+            return view.cast('d')
+        return _StringColumn(view, self.rows, c['type'])
+
+    def to_numpy(self, name: str):
+        """
+        Returns a numeric column as read-only numpy array sharing the mapped memory (requires numpy).
+        """
+        import numpy as np
+        c = self.columns[name]
+        if c['type'] not in ('i8', 'f8'):
+            raise TypeError('Column ' + name + ' is not numeric but ' + c['type'])
+        return np.frombuffer(self._mmap, dtype=np.int64 if c['type'] == 'i8' else np.float64,
+                             count=self.rows, offset=self._data_offset + c['offset'])
+
+    def records(self):
+        """
+        Returns all rows as list of dicts (copies the data).
+        """
+        columns = {name: self.column(name) for name in self.columns}
+        return [{name: values[i] for name, values in columns.items()} for i in range(self.rows)]
+
+    def close(self):
+        """
+        Closes the mapping. All columns returned before must have been released.
+        """
+        self._view.release()
+        self._mmap.close()
+
+
+class DatasetCatalog():
+    """
+    Maps (endpoint, ISIN, range) to dataset files in a directory. The catalog is an SQLite database,
+    so several processes on one host can share it. Range bounds are stored as UTC timestamps of fixed width,
+    naive dates and datetimes are taken as local time, a date as end covers the whole day. An open or future end
+    is stored as the time of fetching, so such a dataset only covers later requests ending before that.
+    A stored dataset covering more than the requested range is cut to it and stored as well.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._db_file = os.path.join(path, 'catalog.sqlite')
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS datasets (endpoint TEXT, isin TEXT, start TEXT, end TEXT, '
+                       'file TEXT, rows INTEGER, created REAL, PRIMARY KEY (endpoint, isin, start, end))')
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success and always closes, sqlite3's own context manager only commits
+        db = sqlite3.connect(self._db_file, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _key(self, value, end: bool = False):
+        if value is None:
+            value = datetime.now(timezone.utc)
+        elif isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        elif not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.max.time() if end else datetime.min.time())
+        if value.tzinfo is None:
+            value = value.astimezone()
+        # Fixed width, so text comparison in SQL is chronological
+        return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+    def _find(self, endpoint, isin, start, end):
+        # Returns (file name, start, end) of the newest dataset covering the range or None
+        with self._connect() as db:
+            row = db.execute('SELECT file, start, end FROM datasets WHERE endpoint = ? AND isin = ? AND start <= ? '
+                             'AND end >= ? ORDER BY created DESC LIMIT 1',
+                             (endpoint, isin, self._key(start), self._key(end, True))).fetchone()
+        if row is None or not os.path.exists(os.path.join(self.path, row[0])):
+            return None
+        return (os.path.join(self.path, row[0]), row[1], row[2])
+
+    def find(self, endpoint: str, isin: str, start, end):
+        """
+        Returns file name of a dataset covering the requested range or None. End None means now.
+        The dataset may cover more than the requested range.
+        """
+        found = self._find(endpoint, isin, start, end)
+        return None if found is None else found[0]
+
+    def add(self, endpoint: str, isin: str, start, end, records: list, fetched: datetime = None):
+        """
+        Writes records as dataset and registers it. Returns the file name.
+        An end after fetched (the time the records were requested, default now) is stored as fetched.
+        """
+        start, end = self._key(start), min(self._key(end, True), self._key(fetched))
+        name = '_'.join((endpoint, isin, start, end)).replace(':', '').replace('.', '') + '.bf4py'
+        write_dataset(os.path.join(self.path, name), records,
+                      {'endpoint': endpoint, 'isin': isin, 'start': start, 'end': end})
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (endpoint, isin, start, end, name, len(records), time.time()))
+        return os.path.join(self.path, name)
+
+    def open(self, endpoint: str, isin: str, start, end, fetch: callable = None, time_key: str = None):
+        """
+        Opens the dataset covering the requested range. If there is none, fetch() is called to get
+        the records, which are stored first. Returns MappedDataset or None.
+        If time_key is given, a stored dataset covering more than the range is cut to the records whose
+        time_key lies within it. Without time_key such a dataset is returned as it is.
+        """
+        found = self._find(endpoint, isin, start, end)
+        if found is None:
+            if fetch is None:
+                return None
+            fetched = datetime.now(timezone.utc)
+            return MappedDataset(self.add(endpoint, isin, start, end, fetch(), fetched))
+
+        path, stored_start, stored_end = found
+        lower, upper = self._key(start), min(self._key(end, True), stored_end)
+        if time_key is None or (stored_start, stored_end) == (lower, upper):
+            return MappedDataset(path)
+        with MappedDataset(path) as dataset:
+            times = dataset.column(time_key)
+            records = [r for r, t in zip(dataset.records(), times) if t is not None and lower <= self._key(t) <= upper]
+            del times
+        return MappedDataset(self.add(endpoint, isin, lower, upper, records, stored_end))
+
+    def times_sales(self, equities, start: datetime, end: datetime, isin: str):
+        """
+        Opens times/sales of given ISIN, fetching them with Equities.times_sales() if not stored yet.
+        """
+        return self.open('tick_data', isin, start, end, lambda: equities.times_sales(start, end, isin), 'time')
+
+    def eod_data(self, general, min_date: date, max_date: date, isin: str, mic: str = 'XETR'):
+        """
+        Opens end-of-day data of given ISIN, fetching them with General.eod_data() if not stored yet.
+        Data up to today is never complete, so such a range is fetched again on every call.
+        """
+        return self.open('price_history_' + mic, isin, min_date, max_date,
+                         lambda: general.eod_data(min_date, max_date, isin, mic), 'date')
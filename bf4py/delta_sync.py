@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, hashlib, json, os
+
+from .connector import BF4PyConnector, get_connector
+from ._utils import _iter_pages, DERIVATIVE_SEARCH, BOND_SEARCH
+
+_ENDPOINTS = {'derivatives': DERIVATIVE_SEARCH,
+              'bonds': BOND_SEARCH}
+
+
+class SearchSync():
+    """
+    Delta sync of a derivatives or bonds search. The previous result set is kept on disk as ISIN, content hash
+    and position, every sync() reports only added, removed and changed instruments.
+    The remote query is sorted by a stable key, so consecutive runs see the same order.
+    """
+    def __init__(self, path: str, search: str, params: dict, connector: BF4PyConnector = None, sorting: str = 'NAME',
+                 sort_order: str = 'ASC', ignore_fields: list = (), isin_key: str = 'isin'):
+        """
+        Parameters
+        ----------
+        path : str
+            File holding the state of the previous run.
+        search : str
+            'derivatives' or 'bonds'.
+        params : dict
+            Search parameters, see Derivatives.search_params() and Bonds.search_parameter_template().
+        connector : BF4PyConnector, optional
+            Connector to use.
+        sorting : str, optional
+            Sort key sent with the query. Must give a stable order, e.g. not a price. The default is 'NAME'.
+        sort_order : str, optional
+            'ASC' or 'DESC'. The default is 'ASC'.
+        ignore_fields : list, optional
+            Record keys excluded from the content hash, e.g. volatile prices. The default is ().
+        isin_key : str, optional
+            Key of the ISIN in the records. The default is 'isin'.
+
+        """
+        assert search in _ENDPOINTS, 'Unknown search ' + str(search)
+        self.path = path
+        self.endpoint = _ENDPOINTS[search]
+        self.params = dict(params)
+        self.params.pop('offset', None)
+        self.params.pop('limit', None)
+        self.params['sorting'] = sorting
+        self.params['sortOrder'] = sort_order
+        self.ignore_fields = set(ignore_fields)
+        self.isin_key = isin_key
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        # ISINs in remote order of the previous run and {isin: content hash}
+        self.order = []
+        self.hashes = {}
+        self._query = self._hash(self.params)
+
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                state = json.load(f)
+            # A different query makes the previous result set meaningless
+            if state['query'] == self._query:
+                self.order = state['order']
+                self.hashes = state['hashes']
+
+    def __len__(self):
+        return len(self.order)
+
+    def _hash(self, record):
+        content = {k: v for k, v in record.items() if k not in self.ignore_fields}
+        return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_file = self.path + '.tmp'
+        with gzip.open(tmp_file, 'wt', encoding='utf-8') as f:
+            json.dump({'query': self._query, 'order': self.order, 'hashes': self.hashes}, f)
+        os.replace(tmp_file, self.path)
+
+    def sync(self, stable_run: int = 0):
+        """
+        Runs the search and compares it with the previous run.
+
+        Parameters
+        ----------
+        stable_run : int, optional
+            Stop early after this many consecutive unchanged records found in the same order as before.
+            Only useful if changes concentrate at the start of the sort order (e.g. newest first).
+            Instruments not seen before the stop point are assumed unchanged, removals are only reported
+            by a complete run. The default is 0 (=read everything).
+
+        Returns
+        -------
+        delta : dict
+            'added' and 'changed' (lists of records), 'removed' (list of ISINs), 'unchanged' (count),
+            'complete' (False if stopped early) and 'total' (count of known instruments).
+
+        """
+        position = {isin: n for n, isin in enumerate(self.order)}
+        seen = set()
+        order = []
+        hashes = {}
+        added = []
+        changed = []
+        unchanged = 0
+        streak = 0
+        last_position = -1
+        complete = True
+
+        pages = _iter_pages(self.connector, self.endpoint, self.params)
+        try:
+            for page in pages:
+                for record in page:
+                    isin = record.get(self.isin_key)
+                    if isin is None or isin in seen:
+                        # Duplicates may appear if the order shifts between pages
+                        continue
+                    seen.add(isin)
+                    order.append(isin)
+                    hashes[isin] = self._hash(record)
+
+                    previous = self.hashes.get(isin)
+                    if previous is None:
+                        added.append(record)
+                        streak = 0
+                    elif previous != hashes[isin]:
+                        changed.append(record)
+                        streak = 0
+                    else:
+                        unchanged += 1
+                        # Stable region: unchanged records directly following each other in the previous order
+                        streak = streak + 1 if position[isin] == last_position + 1 else 1
+                    if isin in position:
+                        last_position = position[isin]
+
+                    if stable_run > 0 and streak >= stable_run:
+                        complete = False
+                        break
+                if not complete:
+                    break
+        finally:
+            pages.close()
+
+        if complete:
+            removed = [isin for isin in self.order if isin not in seen]
+        else:
+            # An instrument missing before the stop point may have moved behind it, so nothing is known as removed
+            removed = []
+            for isin in self.order:
+                if isin not in seen:
+                    order.append(isin)
+                    hashes[isin] = self.hashes[isin]
+                    unchanged += 1
+
+        self.order = order
+        self.hashes = hashes
+        self.save()
+
+        return {'added': added, 'changed': changed, 'removed': removed, 'unchanged': unchanged,
+                'complete': complete, 'total': len(order)}
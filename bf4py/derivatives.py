@@ -4,7 +4,8 @@
 
 from datetime import date, datetime, timezone, time
 
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
+from ._utils import _read_paged, DERIVATIVES_TRADE_HISTORY, DERIVATIVE_SEARCH
 
 class Derivatives():
     def __init__(self, connector: BF4PyConnector = None, default_isin = None, default_mic = 'XETR'):
@@ -12,12 +13,12 @@ class Derivatives():
         self.default_mic = default_mic
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
 
 
-    def trade_history(self, search_date:date):
+    def trade_history(self, search_date:date, start_time:time=time(8,0,0), end_time:time=time(22,0,0), sink=None):
         """
         Returns the times/sales list of every traded derivative for given day. 
         Works for a wide range of dates, however details on instruments get less the more you move to history.
@@ -26,6 +27,12 @@ class Derivatives():
         ----------
         search_date : date
             Date for which derivative trades should be received.
+        start_time : time, optional
+            Local start time of the window. The default is 08:00.
+        end_time : time, optional
+            Local end time of the window. The default is 22:00.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
     
         Returns
         -------
@@ -33,27 +40,11 @@ class Derivatives():
             A list of dicts with details about trade and instrument.
     
         """
-        CHUNK_SIZE = 1000
-        i = 0
-        maxCount = CHUNK_SIZE + 1
-        
-        params = {'from': datetime.combine(search_date, time(8,0,0)).astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
-                  'to': datetime.combine(search_date, time(22,0,0)).astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
-                  'limit': CHUNK_SIZE,
-                  'offset': 0,
+        params = {'from': datetime.combine(search_date, start_time).astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
+                  'to': datetime.combine(search_date, end_time).astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
                   'includePricesWithoutTurnover': False}
         
-        tradelist = []
-        
-        while i * CHUNK_SIZE < maxCount:
-            params['offset'] = i * CHUNK_SIZE
-            
-            data = self.connector.data_request('derivatives_trade_history', params)
-            
-            maxCount = data['totalElements']
-            tradelist += data['data']
-            
-            i += 1
+        tradelist = _read_paged(self.connector, DERIVATIVES_TRADE_HISTORY, params, sink=sink)
         
         return tradelist
     
@@ -173,7 +164,7 @@ class Derivatives():
         return params
     
     
-    def search_derivatives(self, params):
+    def search_derivatives(self, params, sink=None):
         """
         Searches for derivatives using specified parameters.
 
@@ -182,6 +173,8 @@ class Derivatives():
         params : dict
             Dict with parameters for derivatives search. Use search_params() to get a params template.
             Note that providing a parameter that is not intended for the derivative type (e.g. knock-out for regular option) may lead to empty results.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
 
         Returns
         -------
@@ -189,21 +182,6 @@ class Derivatives():
             Returns a list of derivatives matching the search criterias.
 
         """
-        CHUNK_SIZE = 1000
-        i = 0
-        maxCount = CHUNK_SIZE + 1
-        params['limit'] = CHUNK_SIZE
-        
-        derivatives_list = []
-        
-        while i * CHUNK_SIZE < maxCount:
-            params['offset'] = i * CHUNK_SIZE
-            
-            data = self.connector.search_request('derivative_search', params)
-            
-            maxCount = data['recordsTotal']
-            derivatives_list += data['data']
-            
-            i += 1
+        derivatives_list = _read_paged(self.connector, DERIVATIVE_SEARCH, params, sink=sink)
         
         return derivatives_list
\ No newline at end of file
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .connector import BF4PyConnector, get_connector
+from .derivatives import Derivatives
+
+
+class DerivativeMasterData():
+    """
+    Persistent cache of derivatives master data (Derivatives.instrument_data()) used to enrich trade history.
+    Master data of a derivative does not change during its lifetime, so every ISIN is fetched once and kept.
+    ISINs whose request failed are not requested again for failure_ttl seconds.
+    The cache is an SQLite database, so several processes on one host can share it.
+    """
+    def __init__(self, path: str, connector: BF4PyConnector = None, max_workers: int = 8, mic: str = None,
+                 failure_ttl: float = 86400.):
+        """
+        Parameters
+        ----------
+        path : str
+            SQLite file used as cache.
+        connector : BF4PyConnector, optional
+            Connector to use.
+        max_workers : int, optional
+            Number of concurrent requests. The default is 8.
+        mic : str, optional
+            Exchange for master data requests. The default is None (=default of Derivatives).
+        failure_ttl : float, optional
+            Seconds a failed ISIN is skipped by fetch(). The default is 86400 (one day).
+
+        """
+        self.path = path
+        self.max_workers = max_workers
+        self.mic = mic
+        self.failure_ttl = failure_ttl
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        self.derivatives = Derivatives(self.connector)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS master_data (isin TEXT PRIMARY KEY, data TEXT, fetched REAL)')
+            db.execute('CREATE TABLE IF NOT EXISTS failures (isin TEXT PRIMARY KEY, error TEXT, failed REAL)')
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success and always closes, sqlite3's own context manager only commits
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def __contains__(self, isin):
+        return len(self.get([isin])) == 1
+
+    def get(self, isins: list):
+        """
+        Returns {ISIN: master data} of all given ISINs found in the cache, without calling the API.
+        """
+        isins = list(dict.fromkeys(isins))
+        with self._lock:
+            result = {i: self._memory[i] for i in isins if i in self._memory}
+        missing = [i for i in isins if i not in result]
+
+        loaded = {}
+        with self._connect() as db:
+            # Stay below SQLite's limit of host parameters
+            for n in range(0, len(missing), 500):
+                chunk = missing[n:n + 500]
+                rows = db.execute('SELECT isin, data FROM master_data WHERE isin IN (' + ','.join('?' * len(chunk)) + ')', chunk)
+                for isin, data in rows:
+                    loaded[isin] = json.loads(data)
+
+        with self._lock:
+            self._memory.update(loaded)
+        result.update(loaded)
+        return result
+
+    def failures(self):
+        """
+        Returns {ISIN: error} of ISINs whose last request failed within failure_ttl.
+        """
+        with self._connect() as db:
+            rows = db.execute('SELECT isin, error FROM failures WHERE failed > ?', (time.time() - self.failure_ttl,))
+            return dict(rows.fetchall())
+
+    def fetch(self, isins: list):
+        """
+        Fetches master data of all given ISINs which are not cached yet, concurrently.
+        ISINs which failed within failure_ttl are skipped.
+
+        Returns
+        -------
+        stats : dict
+            Number of cached, fetched and skipped ISINs and {ISIN: error} of ISINs failed by this call.
+
+        """
+        isins = list(dict.fromkeys(i for i in isins if i is not None))
+        cached = self.get(isins)
+        recent = self.failures()
+        missing = [i for i in isins if i not in cached and i not in recent]
+
+        def fetch_one(isin):
+            try:
+                return isin, self.derivatives.instrument_data(isin, self.mic), None
+            except Exception as e:
+                return isin, None, e
+
+        fetched = {}
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for isin, data, error in executor.map(fetch_one, missing):
+                if error is not None:
+                    failed[isin] = repr(error)
+                elif data is not None:
+                    fetched[isin] = data
+
+        now = time.time()
+        with self._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO master_data VALUES (?, ?, ?)',
+                           [(isin, json.dumps(data), now) for isin, data in fetched.items()])
+            db.executemany('INSERT OR REPLACE INTO failures VALUES (?, ?, ?)',
+                           [(isin, error, now) for isin, error in failed.items()])
+            db.executemany('DELETE FROM failures WHERE isin = ?', [(isin,) for isin in fetched])
+        with self._lock:
+            self._memory.update(fetched)
+
+        return {'cached': len(cached), 'fetched': len(fetched), 'skipped': len(isins) - len(cached) - len(missing),
+                'failed': failed}
+
+    def enrich(self, trades, fields: list = None, isin_key: str = 'isin', prefix: str = '', overwrite: bool = False):
+        """
+        Adds master data to trades. Master data of all unique ISINs is fetched first, then joined per column.
+
+        Parameters
+        ----------
+        trades : list or dict
+            List of dicts as returned by Derivatives.trade_history() or dict of lists as returned by TradeHistoryBackfill.load().
+        fields : list, optional
+            Top-level keys of the master data to add. The default is None (=all).
+        isin_key : str, optional
+            Key of the ISIN in the trades. The default is 'isin'.
+        prefix : str, optional
+            Prefix for added keys. The default is ''.
+        overwrite : bool, optional
+            Replace values already present in the trades. The default is False (=only fill missing values).
+
+        Returns
+        -------
+        trades : list or dict
+            Given trades (same object) with added keys.
+
+        """
+        columnar = isinstance(trades, dict)
+        isin_column = trades.get(isin_key, []) if columnar else [t.get(isin_key) for t in trades]
+
+        self.fetch(isin_column)
+        master = self.get([i for i in isin_column if i is not None])
+
+        if fields is None:
+            fields = list(dict.fromkeys(k for m in master.values() for k in m))
+
+        for field in fields:
+            key = prefix + field
+            values = [master[i].get(field) if i in master else None for i in isin_column]
+            if columnar:
+                existing = trades.get(key)
+                if existing is None or overwrite:
+                    trades[key] = values
+                else:
+                    trades[key] = [e if e is not None else v for e, v in zip(existing, values)]
+            else:
+                for t, v in zip(trades, values):
+                    if overwrite or t.get(key) is None:
+                        t[key] = v
+        return trades
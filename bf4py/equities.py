@@ -3,15 +3,18 @@
 
 
 
+import os
 from datetime import datetime, timezone
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
+from ._utils import _read_paged, _read_paged_many, BID_ASK_HISTORY, TICK_DATA
+from ._columnar import write_partition
 
 class Equities():
     def __init__(self, connector: BF4PyConnector = None, default_isin = None):
         self.default_isin = default_isin
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
     
@@ -68,7 +71,7 @@ class Equities():
     
     
     
-    def bid_ask_history(self, start: datetime, end: datetime=datetime.now(), isin:str = None):
+    def bid_ask_history(self, start: datetime, end: datetime=datetime.now(), isin:str = None, sink=None):
         """
         Get best bid/ask price history of specific equity (by ISIN). This usually works for about the last two weeks.
     
@@ -80,6 +83,8 @@ class Equities():
             Startng date. Should not be more than two weeks ago
         end : datetime
             End date.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
     
         Returns
         -------
@@ -91,32 +96,16 @@ class Equities():
             isin = self.default_isin
         assert isin is not None, 'No ISIN given'
             
-        #Initializing
-        ba_history = []
-        i = 0
-        CHUNK_SIZE = 1000
-        maxCount = CHUNK_SIZE + 1
-        
-        params = {'limit': CHUNK_SIZE,
-                  'offset': 0,
-                  'isin': isin,
+        params = {'isin': isin,
                   'mic': 'XETR',
                   'from': start.astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
                   'to': end.astimezone(timezone.utc).isoformat().replace('+00:00','Z')}
         
-        while i * CHUNK_SIZE < maxCount:
-            params['offset'] = i * CHUNK_SIZE
-            
-            data = self.connector.data_request('bid_ask_history', params)
-            
-            maxCount = data['totalCount']
-            ba_history += data['data']
-            
-            i += 1
+        ba_history = _read_paged(self.connector, BID_ASK_HISTORY, params, sink=sink)
             
         return ba_history
     
-    def times_sales(self, start: datetime, end: datetime=None, isin: str = None):
+    def times_sales(self, start: datetime, end: datetime=None, isin: str = None, sink=None):
         """
         Get time/sales history of specific equity (by ISIN) from XETRA. This usually works for about the last two weeks.
     
@@ -128,6 +117,8 @@ class Equities():
             Startng date. Should not be more than two weeks ago
         end : datetime
             End date.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
     
         Returns
         -------
@@ -142,29 +133,74 @@ class Equities():
         if end is None:
             end = datetime.now()
         
-        ts_list = []
-        i = 0
-        CHUNK_SIZE = 10000
-        maxCount = CHUNK_SIZE + 1
-        
         params = {'isin': isin,
-                  'limit': CHUNK_SIZE,
-                  'offset': 0,
                   'mic': 'XETR',
                   'minDateTime': start.astimezone(timezone.utc).isoformat().replace('+00:00','Z'),
                   'maxDateTime': end.astimezone(timezone.utc).isoformat().replace('+00:00','Z')}
         
-        while i * CHUNK_SIZE < maxCount:
-            params['offset'] = i * CHUNK_SIZE
-            
-            data = self.connector.data_request('tick_data', params)
-            
-            maxCount = data['totalCount']
-            ts_list += data['ticks']
-            
-            i += 1
+        ts_list = _read_paged(self.connector, TICK_DATA, params, sink=sink)
+        
         return ts_list
     
+    def times_sales_bulk(self, start: datetime, end: datetime = None, isins: list = None, max_workers: int = 8,
+                         path: str = None, callback: callable = None, sink=None):
+        """
+        Get time/sales history of many equities from XETRA. Pages of all ISINs are fetched over one worker pool,
+        the first pages of all ISINs before later pages of very liquid ones. Use a connector with a
+        RequestScheduler to limit the request rate.
+    
+        Parameters
+        ----------
+        start : datetime
+            Startng date. Should not be more than two weeks ago
+        end : datetime, optional
+            End date. The default is now.
+        isins : list
+            Desired ISINs.
+        max_workers : int, optional
+            Number of concurrent requests. The default is 8.
+        path : str, optional
+            If given, every ISIN is written as compressed columnar partition <path>/<ISIN>.json.gz as soon as it is complete,
+            see bf4py.backfill for reading. The default is None.
+        callback : callable, optional
+            Called with ISIN and list of dicts as soon as an ISIN is complete. The default is None.
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) with an additional key 'isin', in order per ISIN
+            but interleaved between ISINs. Without path and callback, records are not kept in memory. The default is None.
+    
+        Returns
+        -------
+        result : dict
+            {ISIN: list of dicts with time/sales data} or, if path, callback or sink is given, {ISIN: count of records}.
+    
+        """
+        assert isins is not None and len(isins) > 0, 'No ISINs given'
+        
+        if end is None:
+            end = datetime.now()
+        
+        min_time = start.astimezone(timezone.utc).isoformat().replace('+00:00','Z')
+        max_time = end.astimezone(timezone.utc).isoformat().replace('+00:00','Z')
+        params = {isin: {'isin': isin,
+                         'mic': 'XETR',
+                         'minDateTime': min_time,
+                         'maxDateTime': max_time} for isin in isins}
+        
+        on_complete = callback
+        if path is not None:
+            def on_complete(isin, records):
+                write_partition(os.path.join(path, isin + '.json.gz'), records,
+                                {'isin': isin, 'endpoint': 'tick_data', 'start': min_time, 'end': max_time})
+                if callback is not None:
+                    callback(isin, records)
+        
+        on_page = None
+        if sink is not None:
+            def on_page(isin, records):
+                sink.write([dict(r, isin=isin) for r in records])
+        
+        return _read_paged_many(self.connector, TICK_DATA, params, max_workers, on_complete, on_page)
+    
     def related_indices(self, isin:str = None):
         """
         Get list of indices in which equity is listed.
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading, time
+from collections import deque, OrderedDict
+
+
+class EventBus():
+    """
+    Fans out received stream events to several subscribers. Every subscriber has its own bounded
+    buffer, so a slow consumer never stalls the receiving thread (unless policy 'block' is chosen).
+    """
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.subscriptions = []
+        self.published = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: callable = None, policy: str = 'drop_oldest', maxsize: int = None, key: callable = None):
+        """
+        Adds a new subscriber to the bus.
+
+        Parameters
+        ----------
+        callback : callable, optional
+            If given, a dispatcher thread calls it for every event. Otherwise use Subscription.get() or iterate over the subscription.
+        policy : str, optional
+            Behaviour if the buffer is full: 'drop_oldest' discards the oldest event, 'block' lets the publisher wait,
+            'conflate' keeps only the latest event per key (ISIN by default). The default is 'drop_oldest'.
+        maxsize : int, optional
+            Buffer size of this subscriber. The default is the size given to the bus.
+        key : callable, optional
+            Function returning the conflation key of an event. The default is the key given to publish(),
+            falling back to field 'isin' of the event.
+
+        Returns
+        -------
+        subscription : Subscription
+
+        """
+        subscription = Subscription(self, policy, self.maxsize if maxsize is None else maxsize, key, callback)
+        with self._lock:
+            # Copy on write, so publish() can iterate without holding the lock
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription._close()
+
+    def publish(self, data, key=None):
+        """
+        Puts one event into the buffers of all subscribers. Key is used for conflation, e.g. the ISIN of the stream.
+        """
+        self.published += 1
+        received = time.monotonic()
+        for s in self.subscriptions:
+            # A failing subscriber must not keep the event from the others
+            try:
+                s._put(received, data, key)
+            except Exception as e:
+                s.dropped += 1
+                print('bf4py EventBus subscriber', s.name, 'raised', repr(e))
+
+    def lag(self):
+        """
+        Returns a list of dicts with pending events, dropped events and delay of the oldest pending event (seconds) per subscriber.
+        """
+        return [{'name': s.name, 'pending': s.pending, 'dropped': s.dropped, 'delay': s.delay} for s in self.subscriptions]
+
+    def close(self):
+        for s in self.subscriptions:
+            self.unsubscribe(s)
+
+
+class Subscription():
+    def __init__(self, bus: EventBus, policy: str, maxsize: int, key: callable = None, callback: callable = None):
+        assert policy in ('drop_oldest', 'block', 'conflate'), 'Unknown policy ' + str(policy)
+
+        self.bus = bus
+        self.policy = policy
+        self.maxsize = maxsize
+        self.key = key
+        self.callback = callback
+        self.name = getattr(callback, '__name__', None) if callback is not None else None
+        self.dropped = 0
+        self.consumed = 0
+        self.closed = False
+
+        if policy == 'conflate':
+            self._buffer = OrderedDict()
+        elif policy == 'drop_oldest':
+            self._buffer = deque(maxlen=maxsize)
+        else:
+            self._buffer = deque()
+        self._cond = threading.Condition()
+
+        self.dispatcher_thread = None
+        if callback is not None:
+            thread = threading.Thread(target=self._dispatch, name='bf4py.EventBus_' + str(self.name))
+            thread.daemon = True
+            thread.start()
+            self.dispatcher_thread = thread
+
+    def __iter__(self):
+        while True:
+            data = self.get()
+            if data is None and self.closed:
+                return
+            yield data
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    @property
+    def delay(self):
+        try:
+            if self.policy == 'conflate':
+                received = next(iter(self._buffer.values()))[0]
+            else:
+                received = self._buffer[0][0]
+        except (IndexError, StopIteration, RuntimeError):
+            return 0.
+        return time.monotonic() - received
+
+    def get(self, timeout: float = None):
+        """
+        Returns the next event or None if timeout expired or subscription was closed.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._buffer) > 0 or self.closed, timeout):
+                return None
+            if len(self._buffer) == 0:
+                return None
+            if self.policy == 'conflate':
+                _, (received, data) = self._buffer.popitem(last=False)
+            else:
+                received, data = self._buffer.popleft()
+            self.consumed += 1
+            self._cond.notify_all()
+        return data
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def _close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _put(self, received, data, key=None):
+        with self._cond:
+            if self.policy == 'conflate':
+                if self.key is not None:
+                    k = self.key(data)
+                elif key is not None:
+                    k = key
+                else:
+                    k = data.get('isin') if isinstance(data, dict) else None
+                if k in self._buffer:
+                    del self._buffer[k]
+                    self.dropped += 1
+                elif len(self._buffer) >= self.maxsize:
+                    self._buffer.popitem(last=False)
+                    self.dropped += 1
+                self._buffer[k] = (received, data)
+            elif self.policy == 'drop_oldest':
+                if len(self._buffer) == self.maxsize:
+                    self.dropped += 1
+                self._buffer.append((received, data))
+            else:
+                self._cond.wait_for(lambda: len(self._buffer) < self.maxsize or self.closed)
+                if self.closed:
+                    return
+                self._buffer.append((received, data))
+            self._cond.notify_all()
+
+    def _dispatch(self):
+        for data in self:
+            try:
+                self.callback(data)
+            except Exception as e:
+                print('bf4py EventBus callback', self.name, 'raised', repr(e))
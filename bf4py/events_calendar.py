@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect, hashlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from .connector import BF4PyConnector, get_connector
+from .company import Company
+
+
+class EventCalendar():
+    """
+    Market-wide calendar of upcoming company events (earnings, dividends, general meetings, ...).
+    Events are fetched concurrently per company with Company.upcoming_events(), cached on disk with a TTL
+    and indexed by date, so queries are answered locally.
+    """
+    def __init__(self, path: str, connector: BF4PyConnector = None, ttl: float = 86400., max_workers: int = 8,
+                 limit: int = 100, date_key: str = 'date'):
+        """
+        Parameters
+        ----------
+        path : str
+            JSON file used as cache.
+        connector : BF4PyConnector, optional
+            Connector to use.
+        ttl : float, optional
+            Seconds until events of a company are requested again. The default is 86400 (one day).
+        max_workers : int, optional
+            Number of concurrent requests. The default is 8.
+        limit : int, optional
+            Maximum count of events per company. The default is 100.
+        date_key : str, optional
+            Key of the event date in the event dicts. The default is 'date'.
+
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.limit = limit
+        self.date_key = date_key
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        self.company = Company(self.connector)
+
+        # {isin: {'events': [...], 'hash': str, 'fetched': timestamp}}
+        self.companies = {}
+        # Sorted list of dates and {date: [(isin, event), ...]}
+        self._dates = []
+        self._by_date = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.companies = json.load(f)['companies']
+            for isin, entry in self.companies.items():
+                self._index(isin, entry['events'])
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'companies': self.companies})
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(data)
+        os.replace(tmp_file, self.path)
+
+    def _event_date(self, event):
+        value = event.get(self.date_key)
+        if not isinstance(value, str) or len(value) < 10:
+            return None
+        return value[:10]
+
+    def _index(self, isin, events):
+        for e in events:
+            d = self._event_date(e)
+            if d is None:
+                continue
+            if d not in self._by_date:
+                bisect.insort(self._dates, d)
+                self._by_date[d] = []
+            self._by_date[d].append((isin, e))
+
+    def _unindex(self, isin, events):
+        for d in set(self._event_date(e) for e in events):
+            if d not in self._by_date:
+                continue
+            remaining = [(i, e) for i, e in self._by_date[d] if i != isin]
+            if len(remaining) > 0:
+                self._by_date[d] = remaining
+            else:
+                del self._by_date[d]
+                del self._dates[bisect.bisect_left(self._dates, d)]
+
+    def _needs_refresh(self, isin, today):
+        entry = self.companies.get(isin)
+        if entry is None or time.time() - entry['fetched'] > self.ttl:
+            return True
+        # A passed event means the list of upcoming events is outdated
+        return any(d is not None and d < today for d in map(self._event_date, entry['events']))
+
+    def _fetch(self, isin):
+        data = self.company.upcoming_events(isin, self.limit)
+        if isinstance(data, dict):
+            data = data.get('data', [])
+        events = []
+        seen = set()
+        for e in data or []:
+            key = json.dumps(e, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                events.append(e)
+        events.sort(key=lambda e: self._event_date(e) or '')
+        content_hash = hashlib.sha1(json.dumps(events, sort_keys=True).encode()).hexdigest()
+
+        with self._lock:
+            entry = self.companies.get(isin)
+            changed = entry is None or entry['hash'] != content_hash
+            if changed:
+                if entry is not None:
+                    self._unindex(isin, entry['events'])
+                self._index(isin, events)
+            self.companies[isin] = {'events': events, 'hash': content_hash, 'fetched': time.time()}
+        return changed
+
+    def refresh(self, isins: list, force: bool = False):
+        """
+        Fetches events of all given companies whose cache entry expired or contains passed events.
+
+        Parameters
+        ----------
+        isins : list
+            ISINs of the universe, e.g. members of an index.
+        force : bool, optional
+            Ignore TTL and refresh all companies. The default is False.
+
+        Returns
+        -------
+        stats : dict
+            Number of queried companies, list of ISINs whose events changed and {ISIN: error} of failed companies,
+            which keep their cached events and are queried again by the next refresh.
+
+        """
+        today = date.today().isoformat()
+        todo = [i for i in dict.fromkeys(isins) if force or self._needs_refresh(i, today)]
+
+        def fetch(isin):
+            try:
+                return self._fetch(isin), None
+            except Exception as e:
+                return False, e
+
+        changed = []
+        failed = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for isin, (c, error) in zip(todo, executor.map(fetch, todo)):
+                    if error is not None:
+                        failed[isin] = repr(error)
+                    elif c:
+                        changed.append(isin)
+        finally:
+            self.save()
+        return {'queried': len(todo), 'changed': changed, 'failed': failed}
+
+    def events_between(self, start: date, end: date, isins: list = None):
+        """
+        Returns cached events between start and end (both inclusive), sorted by date.
+
+        Parameters
+        ----------
+        start : date
+            First day.
+        end : date
+            Last day.
+        isins : list, optional
+            Only return events of these companies.
+
+        Returns
+        -------
+        events : list
+            List of event dicts with additional key 'isin'.
+
+        """
+        start, end = start.isoformat()[:10], end.isoformat()[:10]
+        isins = set(isins) if isins is not None else None
+
+        result = []
+        with self._lock:
+            for d in self._dates[bisect.bisect_left(self._dates, start):bisect.bisect_right(self._dates, end)]:
+                for isin, e in self._by_date[d]:
+                    if isins is None or isin in isins:
+                        result.append(dict(e, isin=isin))
+        return result
+
+    def upcoming(self, days: int = 7, isins: list = None):
+        """
+        Returns cached events of the next given days (including today), e.g. all events of the next week.
+        """
+        today = date.today()
+        return self.events_between(today, today + timedelta(days=days - 1), isins)
+
+    def events_of(self, isin: str):
+        """
+        Returns cached events of given company.
+        """
+        with self._lock:
+            return list(self.companies.get(isin, {}).get('events', []))
@@ -3,14 +3,15 @@
 
 from datetime import date
 
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
+from ._utils import _read_paged, EQUITY_SEARCH
 
 class General():
     def __init__(self, connector: BF4PyConnector = None, default_isin = None):
         self.default_isin = default_isin
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
     
@@ -121,16 +122,14 @@ class General():
         """
         params = {'indices' : [isin],
                   'lang': 'de',
-                  'offset': 0,
-                  'limit': 1000,
                   'sorting': 'NAME',
                   'sortOrder': 'ASC'}
         
-        data = self.connector.search_request('equity_search', params)
+        data = _read_paged(self.connector, EQUITY_SEARCH, params)
         
         #Reorganize data
         instrument_list = []
-        for e in data['data']:
+        for e in data:
             i = {'name': self._get_name(e['name']),
                  'isin': e['isin'],
                  'wkn': e['wkn']
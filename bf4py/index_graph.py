@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib, json, os, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from .connector import BF4PyConnector, get_connector
+from .general import General
+from .equities import Equities
+
+
+class IndexMembership():
+    """
+    Bipartite graph of indices and their member equities, cached on disk with a TTL.
+    Members are crawled with General.index_instruments(), indices of members with Equities.related_indices(),
+    both concurrently. Queries are answered from memory.
+    """
+    def __init__(self, path: str, connector: BF4PyConnector = None, ttl: float = 86400., max_workers: int = 8):
+        """
+        Parameters
+        ----------
+        path : str
+            JSON file used as cache.
+        connector : BF4PyConnector, optional
+            Connector to use.
+        ttl : float, optional
+            Seconds until cached entries are refreshed. The default is 86400 (one day).
+        max_workers : int, optional
+            Number of concurrent requests. The default is 8.
+
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_workers = max_workers
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        self.general = General(self.connector)
+        self.equities = Equities(self.connector)
+
+        # {index isin: {'members': [isin, ...], 'hash': str, 'fetched': timestamp}}
+        self.indices = {}
+        # {equity isin: {'name': str, 'wkn': str}}
+        self.instruments = {}
+        # {equity isin: {'indices': [isin, ...], 'fetched': timestamp}}
+        self.related = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                cache = json.load(f)
+            self.indices = cache['indices']
+            self.instruments = cache['instruments']
+            self.related = cache['related']
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({'indices': self.indices, 'instruments': self.instruments, 'related': self.related})
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_file, self.path)
+
+    def _stale(self, entry):
+        return entry is None or time.time() - entry['fetched'] > self.ttl
+
+    def _fetch_members(self, index_isin):
+        members = self.general.index_instruments(index_isin)
+        isins = [m['isin'] for m in members]
+        # Same count does not mean same members, so the sorted member list is compared
+        member_hash = hashlib.sha1(','.join(sorted(isins)).encode()).hexdigest()
+        with self._lock:
+            for m in members:
+                self.instruments[m['isin']] = {'name': m['name'], 'wkn': m['wkn']}
+            entry = self.indices.get(index_isin)
+            changed = entry is None or entry.get('hash') != member_hash
+            self.indices[index_isin] = {'members': isins, 'hash': member_hash, 'fetched': time.time()}
+        return changed
+
+    def _fetch_related(self, isin):
+        data = self.equities.related_indices(isin)
+        if isinstance(data, dict):
+            data = data.get('data', [])
+        indices = [i['isin'] for i in data if isinstance(i, dict) and 'isin' in i]
+        with self._lock:
+            self.related[isin] = {'indices': indices, 'fetched': time.time()}
+
+    def crawl(self, index_isins: list, related: bool = True, follow: bool = False, force: bool = False):
+        """
+        Fetches members of given indices and, optionally, the related indices of all members.
+        Only entries older than the TTL are requested again. Failed requests are collected, the other
+        results are saved in any case.
+
+        Parameters
+        ----------
+        index_isins : list
+            ISINs of indices, e.g. ['DE0008469008'] for DAX.
+        related : bool, optional
+            Fetch related indices of every member. The default is True.
+        follow : bool, optional
+            Also crawl indices found via related indices, until no new index shows up. The default is False.
+        force : bool, optional
+            Ignore TTL and refresh everything. The default is False.
+
+        Returns
+        -------
+        stats : dict
+            Number of reloaded indices, of those whose members changed, of refreshed related indices and
+            {ISIN: error} of failed indices and equities, which keep their cached entries.
+
+        """
+        stats = {'indices': 0, 'changed': 0, 'related': 0, 'failed': {}}
+        todo = list(dict.fromkeys(index_isins))
+        done = set()
+        refreshed = set()
+
+        def run(function, isins):
+            # Yields (isin, result) of successful requests, errors go to stats
+            def call(isin):
+                try:
+                    return function(isin), None
+                except Exception as e:
+                    return None, e
+            for isin, (result, error) in zip(isins, executor.map(call, isins)):
+                if error is not None:
+                    stats['failed'][isin] = repr(error)
+                else:
+                    yield isin, result
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while len(todo) > 0:
+                    stale = [i for i in todo if force or self._stale(self.indices.get(i))]
+                    for _, changed in run(self._fetch_members, stale):
+                        stats['indices'] += 1
+                        stats['changed'] += changed
+                    done.update(todo)
+
+                    if not related:
+                        break
+
+                    members = {m for i in todo for m in self.indices.get(i, {}).get('members', [])}
+                    stale = [m for m in members - refreshed if force or self._stale(self.related.get(m))]
+                    for isin, _ in run(self._fetch_related, stale):
+                        refreshed.add(isin)
+                        stats['related'] += 1
+
+                    if not follow:
+                        break
+                    todo = sorted({i for m in members for i in self.related.get(m, {}).get('indices', [])} - done)
+        finally:
+            self.save()
+        return stats
+
+    def members(self, index_isin: str):
+        """
+        Returns list of dicts (isin, name, wkn) of the cached members of given index.
+        """
+        with self._lock:
+            isins = self.indices.get(index_isin, {}).get('members', [])
+            return [dict(self.instruments.get(i, {}), isin=i) for i in isins]
+
+    def indices_of(self, isin: str):
+        """
+        Returns sorted list of index ISINs containing given equity, combining crawled memberships and related indices.
+        """
+        with self._lock:
+            result = {index for index, entry in self.indices.items() if isin in entry['members']}
+            result.update(self.related.get(isin, {}).get('indices', []))
+        return sorted(result)
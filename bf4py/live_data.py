@@ -1,26 +1,105 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import threading, json
+import threading, json, time
+from datetime import datetime, timedelta, timezone
 
-from .connector import BF4PyConnector
+from .connector import BF4PyConnector, get_connector
+from .event_bus import EventBus
+from .capture import CaptureWriter
+from .quote_table import QuoteTable
+
+# bid_ask_history field names mapped to quote_box field names
+_BID_ASK_HISTORY_FIELDS = {'bidPrice': 'bidLimit',
+                           'askPrice': 'askLimit',
+                           'time': 'timestamp'}
 
 class LiveData():
     def __init__(self, connector: BF4PyConnector = None, default_isin: str = None):
         self.default_isin = default_isin
         self.streaming_clients = []
+        self.recorder = None
+        self.table = None
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
         
     
     def __del__(self):
+        self.close_all()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close_all()
+    
+    def close_all(self, deadline:float=5.0):
+        """
+        Closes all clients of this instance at once: every stream is cancelled first, then the receiver threads
+        are awaited until the deadline has passed.
+    
+        Parameters
+        ----------
+        deadline : float, optional
+            Maximum seconds to wait for all receiver threads. The default is 5.0.
+    
+        Returns
+        -------
+        pending : list
+            Clients whose receiver thread did not stop in time (daemon threads, they do not block exiting).
+    
+        """
         for client in self.streaming_clients:
-            client.close()
+            if client.receiver_thread is not None:
+                client._cancel()
+        
+        end = time.monotonic() + deadline
+        pending = [c for c in self.streaming_clients if not c.close(max(0., end - time.monotonic()))]
+        self.stop_recording()
+        return pending
+    
+    def start_recording(self, path:str, compress:bool=None):
+        """
+        Writes every event received by the clients of this instance to a capture file. Use bf4py.capture.replay() to play it back.
+    
+        Parameters
+        ----------
+        path : str
+            Capture file, data is appended if it exists.
+        compress : bool, optional
+            Compress capture using gzip. The default is None (=compress if path ends with '.gz').
+    
+        Returns
+        -------
+        recorder : CaptureWriter
+    
+        """
+        self.stop_recording()
+        self.recorder = CaptureWriter(path, compress)
+        for client in self.streaming_clients:
+            client.recorder = self.recorder
+        return self.recorder
+    
+    def stop_recording(self):
+        if self.recorder is not None:
+            for client in self.streaming_clients:
+                client.recorder = None
+            self.recorder.close()
+            self.recorder = None
 
-    def price_information(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False):
+    def attach_table(self, table:QuoteTable):
+        """
+        Writes messages received by the clients of this instance into a QuoteTable. Use None to detach.
+        """
+        self.table = table
+        for client in self.streaming_clients:
+            client.table = table
+        return table
+
+    def price_information(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False, bus:EventBus=None, snapshot=False):
         """
         This function streams latest available price information of one instrument.
     
@@ -32,6 +111,10 @@ class LiveData():
             Callback function to evaluate received data. It will get one argument containing JSON data. The default is print.
         mic : str, optional
             Provide appropriate exchange if symbol is not in XETRA. The default is 'XETR'.
+        bus : EventBus, optional
+            If given, received data is published to the bus instead of calling callback on the receiver thread. The default is None.
+        snapshot : bool, optional
+            Seed state with a REST snapshot before streaming and merge received messages into it. Callback then receives the merged state. The default is False.
     
         Returns
         -------
@@ -39,10 +122,10 @@ class LiveData():
             return parameterized BFStreamClient. Use BFStreamClient.open_stream() to start receiving data.
     
         """
-        return self._generate_client('price_information', isin, callback, mic, cache_data)
+        return self._generate_client('price_information', isin, callback, mic, cache_data, bus, snapshot)
 
     
-    def bid_ask_overview(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False):
+    def bid_ask_overview(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False, bus:EventBus=None):
         """
         This function streams top ten bid and ask quotes for given instrument.
     
@@ -54,6 +137,8 @@ class LiveData():
             Callback function to evaluate received data. It will get one argument containing JSON data. The default is print.
         mic : str, optional
             Provide appropriate exchange if symbol is not in XETRA. The default is 'XETR'.
+        bus : EventBus, optional
+            If given, received data is published to the bus instead of calling callback on the receiver thread. The default is None.
     
         Returns
         -------
@@ -61,10 +146,10 @@ class LiveData():
             return parameterized BFStreamClient. Use BFStreamClient.open_stream() to start receiving data.
     
         """
-        return self._generate_client('bid_ask_overview', isin, callback, mic, cache_data)
+        return self._generate_client('bid_ask_overview', isin, callback, mic, cache_data, bus, False)
 
     
-    def live_quotes(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False):
+    def live_quotes(self, isin:str=None, callback:callable=print, mic:str='XETR', cache_data=False, bus:EventBus=None, snapshot=False):
         """
         This function streams latest price quotes from bid and ask side.
     
@@ -76,6 +161,10 @@ class LiveData():
             Callback function to evaluate received data. It will get one argument containing JSON data. The default is print.
         mic : str, optional
             Provide appropriate exchange if symbol is not in XETRA. The default is 'XETR'.
+        bus : EventBus, optional
+            If given, received data is published to the bus instead of calling callback on the receiver thread. The default is None.
+        snapshot : bool, optional
+            Seed state with a REST snapshot before streaming and merge received messages into it. Callback then receives the merged state. The default is False.
     
         Returns
         -------
@@ -83,11 +172,11 @@ class LiveData():
             return parameterized BFStreamClient. Use BFStreamClient.open_stream() to start receiving data.
     
         """
-        return self._generate_client('quote_box', isin, callback, mic, cache_data)
+        return self._generate_client('quote_box', isin, callback, mic, cache_data, bus, snapshot)
 
     
     
-    def _generate_client(self, function, isin, callback, mic, cache_data):
+    def _generate_client(self, function, isin, callback, mic, cache_data, bus, snapshot):
         if isin is None:
             isin = self.default_isin
         assert isin is not None, 'No ISIN given'
@@ -95,13 +184,14 @@ class LiveData():
         params = {'isin': isin,
                   'mic': mic}
         
-        client = BFStreamClient(function, params, callback=callback, connector=self.connector, cache_data=cache_data)
+        client_class = SnapshotStreamClient if snapshot else BFStreamClient
+        client = client_class(function, params, callback=callback, connector=self.connector, cache_data=cache_data, bus=bus, recorder=self.recorder, table=self.table)
         self.streaming_clients.append(client)
         return client
 
 
 class BFStreamClient():
-    def __init__(self, function: str, params: dict, callback:callable=None, connector: BF4PyConnector = None, cache_data=False):
+    def __init__(self, function: str, params: dict, callback:callable=None, connector: BF4PyConnector = None, cache_data=False, bus:EventBus=None, recorder:CaptureWriter=None, table:QuoteTable=None):
         self.active = False
         self.stop = False
         self.endpoint = function
@@ -109,10 +199,14 @@ class BFStreamClient():
         self.callback = callback
         self.receiver_thread = None
         self.cache_data = cache_data
+        self.bus = bus
+        self.recorder = recorder
+        self._recorder_channel = (None, None)
+        self.table = table
         self.data = []
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
     
@@ -123,6 +217,7 @@ class BFStreamClient():
         if not self.active and self.receiver_thread is None:
             self.data = []
             self.stop = False
+            self._prepare_stream()
             thread = threading.Thread(target = self.receive_data, name='bf4py.BFStreamClient_'+self.endpoint+'_'+self.params['isin'])
             thread.daemon = True
             thread.start()
@@ -130,31 +225,168 @@ class BFStreamClient():
             self.active = True
     
     def receive_data(self):
-        self.client = self.connector.stream_request(self.endpoint, self.params)
         try:
+            self.client = self.connector.stream_request(self.endpoint, self.params)
+            # close() may have been called while connecting
+            if self.stop:
+                self.client.close()
+                return
             for event in self.client.events():
                 if self.stop:
                     break
                 if event.event == 'message':
+                    recorder = self.recorder
+                    if recorder is not None:
+                        if self._recorder_channel[0] is not recorder:
+                            self._recorder_channel = (recorder, recorder.channel(self.endpoint, self.params))
+                        recorder.write(self._recorder_channel[1], event.data)
                     try:
                         data = json.loads(event.data)
-                        if self.cache_data:
-                            self.data.append(data)
-                        else:
-                            self.data = [data]
-                        
-                        if self.callback is not None:
-                            self.callback(data)
-                    except:
+                    except ValueError:
                         continue
-        except:
-            print('bf4py Stream Client unintentionally stopped for', self.params['isin'])
-        #self.client.close()
+                    try:
+                        self._handle(data)
+                    except Exception as e:
+                        print('bf4py Stream Client callback raised', repr(e), 'for', self.params['isin'])
+        except Exception:
+            # Closing the socket in close() ends the stream with an error, which is intended
+            if not self.stop:
+                print('bf4py Stream Client unintentionally stopped for', self.params['isin'])
+        finally:
+            self.active = False
+    
+    def _prepare_stream(self):
+        pass
+    
+    def _handle(self, data):
+        if self.cache_data:
+            self.data.append(data)
+        else:
+            self.data = [data]
+        
+        table = self.table
+        if table is not None:
+            # A message the table cannot take must not keep it from callback and bus
+            try:
+                table.update(self.params['isin'], self.params.get('mic'), data)
+            except Exception as e:
+                print('bf4py QuoteTable update failed for', self.params['isin'], repr(e))
+        
+        if self.bus is not None:
+            self.bus.publish(data, self.params['isin'])
+        elif self.callback is not None:
+            self.callback(data)
+        
+    def _cancel(self):
+        # Closing the socket wakes the receiver thread immediately, instead of waiting for the next event
+        self.stop = True
+        client = getattr(self, 'client', None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+    
+    def close(self, timeout:float=None):
+        """
+        Stops the stream and waits up to timeout seconds (None = until done) for the receiver thread.
+        Returns True if the thread has stopped.
+        """
+        thread = self.receiver_thread
+        if thread is None:
+            return True
+        self._cancel()
+        thread.join(timeout)
+        if thread.is_alive():
+            return False
+        self.receiver_thread = None
         self.active = False
+        return True
+    
+    def __enter__(self):
+        self.open_stream()
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class SnapshotStreamClient(BFStreamClient):
+    """
+    Stream client which seeds its state with a REST snapshot before streaming. Received messages
+    are merged into the state, messages older than the current state are discarded.
+    Callback and bus receive the merged state.
+    """
+    def __init__(self, function: str, params: dict, callback:callable=None, connector: BF4PyConnector = None, cache_data=False, bus:EventBus=None, recorder:CaptureWriter=None, table:QuoteTable=None, timestamp_key:str='timestamp'):
+        super().__init__(function, params, callback=callback, connector=connector, cache_data=cache_data, bus=bus, recorder=recorder, table=table)
+        self.timestamp_key = timestamp_key
+        self.state = {}
+        self.last_timestamp = None
+        self.discarded = 0
+        self._state_lock = threading.Lock()
+    
+    def _prepare_stream(self):
+        with self._state_lock:
+            self.state = {}
+            self.last_timestamp = None
+            self.discarded = 0
         
-    def close(self):
-        if self.receiver_thread is not None: 
-            self.stop = True
-            self.receiver_thread.join()
-            self.receiver_thread = None
-            self.active = False
+        try:
+            snapshot = self._snapshot()
+        except Exception as e:
+            print('bf4py could not load snapshot for', self.params['isin'], repr(e))
+            return
+        if snapshot is not None:
+            self._handle(snapshot)
+    
+    def _snapshot(self):
+        if self.endpoint == 'quote_box':
+            # Latest best bid/ask of the last two weeks
+            end = datetime.now(timezone.utc)
+            params = {'isin': self.params['isin'],
+                      'mic': self.params['mic'],
+                      'limit': 25,
+                      'offset': 0,
+                      'from': (end - timedelta(days=14)).isoformat().replace('+00:00','Z'),
+                      'to': end.isoformat().replace('+00:00','Z')}
+            response = self.connector.data_request('bid_ask_history', params)
+            data = response['data']
+            total = response.get('totalCount', len(data))
+            if total > len(data):
+                # Order of the rows is not guaranteed, so also fetch the last page and pick the newest row of both
+                params['offset'] = total - params['limit']
+                data = data + self.connector.data_request('bid_ask_history', params)['data']
+            if len(data) == 0:
+                return None
+            oldest = datetime.min.replace(tzinfo=timezone.utc)
+            latest = max(data, key=lambda e: self._parse_time(e.get(self.timestamp_key, e.get('time'))) or oldest)
+            return {_BID_ASK_HISTORY_FIELDS.get(k, k): v for k, v in latest.items()}
+        else:
+            params = {'isin': self.params['isin']}
+            return self.connector.data_request('instrument_information', params)
+    
+    def _parse_time(self, value):
+        if value is None:
+            return None
+        try:
+            timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+        # Naive timestamps are UTC, so they compare with aware ones
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp
+    
+    def _handle(self, data):
+        with self._state_lock:
+            timestamp = self._parse_time(data.get(self.timestamp_key))
+            if timestamp is not None:
+                if self.last_timestamp is not None and timestamp < self.last_timestamp:
+                    self.discarded += 1
+                    return
+                self.last_timestamp = timestamp
+            self.state.update(data)
+            state = dict(self.state)
+        
+        super()._handle(state)
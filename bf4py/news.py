@@ -2,12 +2,13 @@
 # -*- coding: utf-8 -*-
 
 
-from .connector import BF4PyConnector
+from datetime import datetime
+
+from .connector import BF4PyConnector, get_connector
+from ._utils import _read_paged, CATEGORY_NEWS, INSTRUMENT_NEWS
 
 
 class News():
-    from datetime import datetime
-    
     def __init__(self, connector: BF4PyConnector = None, default_isin = None):
         self.default_isin = default_isin
         
@@ -26,7 +27,7 @@ class News():
                              'CURRENCY']
         
         if connector is None:
-            self.connector = BF4PyConnector()
+            self.connector = get_connector()
         else:
             self.connector = connector
     
@@ -50,7 +51,7 @@ class News():
         
         return data
     
-    def news_by_category(self, news_type: str ='ALL', limit: int=0, end_date: datetime = None):
+    def news_by_category(self, news_type: str ='ALL', limit: int=0, end_date: datetime = None, sink=None):
         """
         Retrieve a list of news for all or a specific category. 
         Note that end_date defines the earliest time to which news should be fetched, as they're always loaded until the current time
@@ -63,6 +64,8 @@ class News():
             Maximum count of news to get. The default is 0 (=unlimited).
         end_date : datetime, optional
             Earliest date up to which news should be loaded. The default is None (=unlimited).
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
     
         Returns
         -------
@@ -73,45 +76,20 @@ class News():
         
         assert news_type in self.category_list
                              
-        news_list = []
-        i = 0
-        CHUNK_SIZE = 1000
-        if limit == 0:
-            maxCount = CHUNK_SIZE + 1
+        params = {'withPaging': True,
+                  'lang': 'de',
+                  'newsType': news_type}
+        
+        if end_date is not None:
+            stop = lambda n: datetime.fromisoformat(n['time']).replace(tzinfo=None) < end_date
         else:
-            maxCount = limit
-        flag = True
-        c = 0
+            stop = None
         
-        while i * CHUNK_SIZE < maxCount and flag:
-            params = {'withPaging': True,
-                      'lang': 'de',
-                      'offset': i * CHUNK_SIZE,
-                      'limit': CHUNK_SIZE,
-                      'newsType': news_type}
-            data = self.connector.data_request('category_news', params)
-            i += 1
-            
-            if limit == 0:
-                maxCount = data['totalCount']
-            
-            for n in data['data']:
-                #Check if either user given limit or end-date are reached
-                if end_date is not None:
-                    if datetime.fromisoformat(n['time']).replace(tzinfo=None) < end_date:
-                        flag = False
-                        break
-                if limit > 0:
-                    if c >= limit:
-                        flag = False
-                        break
-                    
-                news_list.append(n)
-                c += 1
+        news_list = _read_paged(self.connector, CATEGORY_NEWS, params, limit=limit, stop=stop, sink=sink)
         
         return news_list
     
-    def news_by_isin(self, isin:str = None, limit:int=0, end_date: datetime = None):
+    def news_by_isin(self, isin:str = None, limit:int=0, end_date: datetime = None, sink=None):
         """
         Retrieve all news related to a specific ISIN.
     
@@ -123,6 +101,8 @@ class News():
             Maximum count of news to get. The default is 0 (=unlimited).
         end_date : datetime, optional
             Earliest date up to which news should be loaded. The default is None (=unlimited).
+        sink : Sink, optional
+            If given, every page is written to this sink (see bf4py.sinks) and the count of records is returned. The default is None.
     
         Returns
         -------
@@ -134,42 +114,17 @@ class News():
             isin = self.default_isin
         assert isin is not None, 'No ISIN given'
         
-        news_list = []
-        i = 0
-        CHUNK_SIZE = 1000
-        if limit == 0:
-            maxCount = CHUNK_SIZE + 1
+        params = {'withPaging': True,
+                  'lang': 'de',
+                  'isin': isin,
+                  'newsType': 'ALL'}
+        
+        if end_date is not None:
+            stop = lambda n: datetime.fromisoformat(n['time']).replace(tzinfo=None) < end_date
         else:
-            maxCount = limit
-        flag = True
-        c = 0
+            stop = None
         
-        while i * CHUNK_SIZE < maxCount and flag:
-            params = {'withPaging': True,
-                      'lang': 'de',
-                      'offset': i * CHUNK_SIZE,
-                      'limit': CHUNK_SIZE,
-                      'isin': isin,
-                      'newsType': 'ALL'}
-            data = self.connector.data_request('instrument_news', params)
-            i += 1
-            
-            if limit == 0:
-                maxCount = data['totalCount']
-            
-            for n in data['data']:
-                #Check if either user given limit or end-date are reached
-                if end_date is not None:
-                    if datetime.fromisoformat(n['time']).replace(tzinfo=None) < end_date:
-                        flag = False
-                        break
-                if limit > 0:
-                    if c >= limit:
-                        flag = False
-                        break
-                    
-                news_list.append(n)
-                c += 1
+        news_list = _read_paged(self.connector, INSTRUMENT_NEWS, params, limit=limit, stop=stop, sink=sink)
         
         return news_list
     
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, json, os, re, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .connector import BF4PyConnector, get_connector
+from .news import News
+from ._utils import _iter_pages, Endpoint
+
+
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+_WORD_PATTERN = re.compile(r'\w{3,}')
+_ISIN_PATTERN = re.compile(r'\b[A-Z]{2}[A-Z0-9]{9}[0-9]\b')
+
+
+def _newer(time: str, mark: str):
+    # ISO strings of equal length and UTC offset compare chronologically, only others are parsed
+    if len(time) == len(mark) and time[-6:] == mark[-6:]:
+        return time > mark
+    return datetime.fromisoformat(time) > datetime.fromisoformat(mark)
+
+
+class NewsStore():
+    """
+    Local store for news articles. Article bodies are kept as gzip compressed JSON files,
+    a compressed index file holds high-water marks, seen ids, articles which failed to load and
+    inverted indices for keywords and ISINs.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.article_path = os.path.join(path, 'articles')
+        self.index_file = os.path.join(path, 'index.json.gz')
+        self.lock = threading.Lock()
+
+        os.makedirs(self.article_path, exist_ok=True)
+
+        self.high_water_marks = {}
+        self.headlines = {}
+        self.terms = {}
+        self.isins = {}
+        # {news id: {'key', 'headline', 'attempts', 'error'}} of articles which could not be loaded
+        self.failed = {}
+
+        if os.path.exists(self.index_file):
+            with gzip.open(self.index_file, 'rt', encoding='utf-8') as f:
+                index = json.load(f)
+            self.high_water_marks = index['high_water_marks']
+            self.headlines = index['headlines']
+            self.terms = {k: set(v) for k, v in index['terms'].items()}
+            self.isins = {k: set(v) for k, v in index['isins'].items()}
+            self.failed = index.get('failed', {})
+
+    def __contains__(self, news_id):
+        return news_id in self.headlines
+
+    def __len__(self):
+        return len(self.headlines)
+
+    def save(self):
+        """
+        Writes the index to disk. Articles are written immediately by add().
+        """
+        # Snapshot under the lock, ingesting threads keep adding while the index is written
+        with self.lock:
+            index = {'high_water_marks': dict(self.high_water_marks),
+                     'headlines': dict(self.headlines),
+                     'terms': {k: sorted(v) for k, v in self.terms.items()},
+                     'isins': {k: sorted(v) for k, v in self.isins.items()},
+                     'failed': {k: dict(v) for k, v in self.failed.items()}}
+
+        fd, tmp_file = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def add(self, headline: dict, article: dict, isins: list = None):
+        """
+        Stores an article and adds it to the inverted indices.
+
+        Parameters
+        ----------
+        headline : dict
+            News list entry as returned by News.news_by_category() or News.news_by_isin().
+        article : dict
+            Article details as returned by News.news_by_id().
+        isins : list, optional
+            ISINs the article is known to be related to.
+
+        """
+        news_id = headline['id']
+
+        with gzip.open(self._article_file(news_id), 'wt', encoding='utf-8') as f:
+            json.dump(article, f)
+
+        text = ' '.join(self._strings(article))
+        terms = set(_WORD_PATTERN.findall(_TAG_PATTERN.sub(' ', text).lower()))
+        related = set(isins or []) | set(_ISIN_PATTERN.findall(text))
+
+        with self.lock:
+            self.headlines[news_id] = {'time': headline.get('time'),
+                                       'headline': headline.get('headline')}
+            self.failed.pop(news_id, None)
+            for t in terms:
+                self.terms.setdefault(t, set()).add(news_id)
+            for i in related:
+                self.isins.setdefault(i, set()).add(news_id)
+
+    def link_isin(self, news_id: str, isin: str):
+        with self.lock:
+            self.isins.setdefault(isin, set()).add(news_id)
+
+    def set_high_water_mark(self, key: str, time: str):
+        with self.lock:
+            self.high_water_marks[key] = time
+
+    def add_failure(self, key: str, headline: dict, error: str):
+        """
+        Records an article which could not be loaded, returns the number of failed attempts so far.
+        """
+        with self.lock:
+            entry = self.failed.setdefault(headline['id'], {'key': key, 'headline': headline, 'attempts': 0})
+            entry['attempts'] += 1
+            entry['error'] = error
+            return entry['attempts']
+
+    def article(self, news_id: str):
+        """
+        Returns stored article details for given news id.
+        """
+        with gzip.open(self._article_file(news_id), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def search(self, keywords: str = None, isin: str = None):
+        """
+        Searches stored articles without calling the API.
+
+        Parameters
+        ----------
+        keywords : str, optional
+            Words which all must be contained in the article.
+        isin : str, optional
+            ISIN the article must be related to.
+
+        Returns
+        -------
+        result : list
+            List of dicts with id, time and headline, newest first.
+
+        """
+        with self.lock:
+            ids = set(self.headlines)
+            if keywords is not None:
+                for t in _WORD_PATTERN.findall(keywords.lower()):
+                    ids &= self.terms.get(t, set())
+            if isin is not None:
+                ids &= self.isins.get(isin, set())
+
+            result = [dict(self.headlines[i], id=i) for i in ids]
+
+        result.sort(key=lambda n: n['time'] or '', reverse=True)
+        return result
+
+    def _article_file(self, news_id):
+        return os.path.join(self.article_path, re.sub(r'[^\w-]', '_', str(news_id)) + '.json.gz')
+
+    def _strings(self, obj):
+        if isinstance(obj, str):
+            yield obj
+        elif isinstance(obj, dict):
+            for v in obj.values():
+                yield from self._strings(v)
+        elif isinstance(obj, list):
+            for v in obj:
+                yield from self._strings(v)
+
+
+class NewsIngester():
+    """
+    Incrementally fetches news by category or ISIN. Only items newer than the stored
+    high-water mark are requested, article bodies are loaded concurrently and put into a NewsStore.
+    The mark always advances to the newest listed item. Articles which failed to load are kept in
+    NewsStore.failed and requested again by later runs, up to max_attempts times in total.
+    """
+    def __init__(self, store: NewsStore, connector: BF4PyConnector = None, max_workers: int = 8, page_size: int = 100,
+                 max_attempts: int = 3):
+        self.store = store
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+
+        if connector is None:
+            self.connector = get_connector()
+        else:
+            self.connector = connector
+
+        self.news = News(self.connector)
+        # {news id: error} of articles which could not be loaded by this ingester
+        self.errors = {}
+
+    def ingest_category(self, news_type: str = 'ALL'):
+        """
+        Fetches new items of a news category and stores their bodies.
+
+        Parameters
+        ----------
+        news_type : str, optional
+            Desired category, see News.get_categories(). The default is 'ALL'.
+
+        Returns
+        -------
+        new_items : list
+            List of dicts with basic information about the newly stored news.
+
+        """
+        assert news_type in self.news.category_list
+
+        params = {'newsType': news_type}
+        return self._ingest('category:' + news_type, 'category_news', params)
+
+    def ingest_isin(self, isin: str):
+        """
+        Fetches new items related to given ISIN and stores their bodies.
+
+        Parameters
+        ----------
+        isin : str
+            Desired ISIN.
+
+        Returns
+        -------
+        new_items : list
+            List of dicts with basic information about the newly stored news.
+
+        """
+        params = {'isin': isin,
+                  'newsType': 'ALL'}
+        return self._ingest('isin:' + isin, 'instrument_news', params, isin)
+
+    def _ingest(self, key, function, params, isin=None):
+        hwm = self.store.high_water_marks.get(key)
+
+        # News are delivered newest first, stop at first item older than last run
+        if hwm is not None:
+            stop = lambda n: _newer(hwm, n['time'])
+        else:
+            stop = None
+
+        endpoint = Endpoint(function, max_page_size=self.page_size, min_page_size=min(self.page_size, 50))
+        page_params = {'withPaging': True,
+                       'lang': 'de'}
+        page_params.update(params)
+
+        listed = []
+        new_items = []
+        for page in _iter_pages(self.connector, endpoint, page_params, stop=stop):
+            listed.extend(page)
+            for n in page:
+                if n['id'] in self.store:
+                    if isin is not None:
+                        self.store.link_isin(n['id'], isin)
+                    continue
+                new_items.append(n)
+
+        # Articles which failed in earlier runs and have attempts left
+        listed_ids = set(n['id'] for n in new_items)
+        with self.store.lock:
+            retries = [dict(f['headline']) for news_id, f in self.store.failed.items()
+                       if f['key'] == key and f['attempts'] < self.max_attempts and news_id not in listed_ids]
+        new_items.extend(n for n in retries if n['id'] not in self.store)
+
+        def fetch(n):
+            try:
+                return self.news.news_by_id(n['id']), None
+            except Exception as e:
+                return None, e
+
+        stored = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for n, (article, error) in zip(new_items, executor.map(fetch, new_items)):
+                    if error is not None:
+                        # Retried by later runs independent of the mark, so one broken article cannot hold it back
+                        self.errors[n['id']] = repr(error)
+                        self.store.add_failure(key, n, repr(error))
+                        continue
+                    self.store.add(n, article, None if isin is None else [isin])
+                    self.errors.pop(n['id'], None)
+                    stored.append(n)
+
+            mark = hwm
+            for n in listed:
+                if mark is None or _newer(n['time'], mark):
+                    mark = n['time']
+            if mark != hwm:
+                self.store.set_high_water_mark(key, mark)
+        finally:
+            self.store.save()
+
+        return stored
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools, json, random, sys, threading, time
+from contextlib import contextmanager, nullcontext
+
+
+class Span():
+    def __init__(self, name: str, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self.duration = None
+        self.blocks = None
+        self._blocks_start = None
+
+    @property
+    def self_time(self):
+        return self.duration - sum(c.duration for c in self.children if c.duration is not None)
+
+    def to_dict(self):
+        d = {'name': self.name, 'duration': self.duration, 'self_time': self.self_time}
+        if self.blocks is not None:
+            d['allocated_blocks'] = self.blocks
+        d['children'] = [c.to_dict() for c in self.children]
+        return d
+
+
+# Profiler recording a call on the current thread, receives the spans of connector and pagination
+_active = threading.local()
+
+
+class Profiler():
+    """
+    Records a span tree per profiled call: pages, network wait, JSON decoding and post-processing.
+    Only a fraction of calls is recorded if sample_rate < 1. Use instrument() to profile a facade.
+    Spans are recorded by the profiler whose call is running on the current thread, so several
+    profilers can instrument facades sharing one connector.
+    """
+    def __init__(self, sample_rate: float = 1., count_allocations: bool = False, max_calls: int = 1000):
+        """
+        Parameters
+        ----------
+        sample_rate : float, optional
+            Fraction of top-level calls to record. The default is 1.0 (=all).
+        count_allocations : bool, optional
+            Record the change of allocated memory blocks per span (sys.getallocatedblocks). The default is False.
+        max_calls : int, optional
+            Number of recorded calls kept, older ones are dropped. The default is 1000.
+
+        """
+        self.sample_rate = sample_rate
+        self.count_allocations = count_allocations
+        self.max_calls = max_calls
+        self.calls = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _record(self, name):
+        parent = getattr(self._local, 'current', None)
+        span = Span(name, parent)
+        if self.count_allocations:
+            span._blocks_start = sys.getallocatedblocks()
+        self._local.current = span
+        if parent is None:
+            previous = getattr(_active, 'profiler', None)
+            _active.profiler = self
+        try:
+            yield span
+        finally:
+            if parent is None:
+                _active.profiler = previous
+            span.duration = time.perf_counter() - span.start
+            if self.count_allocations:
+                span.blocks = sys.getallocatedblocks() - span._blocks_start
+            self._local.current = parent
+            if parent is not None:
+                parent.children.append(span)
+            else:
+                with self._lock:
+                    self.calls.append(span)
+                    del self.calls[:-self.max_calls]
+
+    def _after_fork(self):
+        # Lock may have been held by another thread of the parent at fork time
+        self._lock = threading.Lock()
+
+    def call(self, name: str):
+        """
+        Context manager for a top-level call, sampled according to sample_rate. Nested calls become spans.
+        """
+        if getattr(self._local, 'current', None) is not None:
+            return self._record(name)
+        if getattr(self._local, 'unsampled', 0) > 0 or random.random() >= self.sample_rate:
+            return self._unsampled()
+        return self._record(name)
+
+    @contextmanager
+    def _unsampled(self):
+        # Suppress spans of nested calls within an unsampled call
+        self._local.unsampled = getattr(self._local, 'unsampled', 0) + 1
+        try:
+            yield None
+        finally:
+            self._local.unsampled -= 1
+
+    def span(self, name: str):
+        """
+        Context manager for a span within the current call. Does nothing outside of a recorded call.
+        """
+        if getattr(self._local, 'current', None) is None:
+            return nullcontext()
+        return self._record(name)
+
+    def instrument(self, facade):
+        """
+        Profiles all public methods of a facade (e.g. BF4Py().equities) including requests and pages
+        of its connector. Other facades sharing the connector are not affected. Returns the facade.
+        """
+        for name in dir(facade):
+            if name.startswith('_'):
+                continue
+            method = getattr(facade, name)
+            if not callable(method) or isinstance(method, type):
+                continue
+            setattr(facade, name, self._wrap(type(facade).__name__ + '.' + name, method))
+        return facade
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.call(name):
+                return method(*args, **kwargs)
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self.calls = []
+
+    def report(self):
+        """
+        Returns the recorded calls as list of nested dicts.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        return [c.to_dict() for c in calls]
+
+    def summary(self):
+        """
+        Returns dict {span path: {'count', 'total', 'self_time', 'allocated_blocks'}} aggregated over all recorded calls.
+        """
+        result = {}
+        def add(span, path):
+            path = path + (span.name,)
+            s = result.setdefault(';'.join(path), {'count': 0, 'total': 0., 'self_time': 0., 'allocated_blocks': 0})
+            s['count'] += 1
+            s['total'] += span.duration
+            s['self_time'] += span.self_time
+            s['allocated_blocks'] += span.blocks or 0
+            for c in span.children:
+                add(c, path)
+
+        with self._lock:
+            calls = list(self.calls)
+        for c in calls:
+            add(c, ())
+        return result
+
+    def folded(self):
+        """
+        Returns self times in folded stack format ("call;page;network 1234" in microseconds per line),
+        which can be read by flamegraph.pl or speedscope.
+        """
+        return '\n'.join(k + ' ' + str(int(v['self_time'] * 1e6)) for k, v in self.summary().items()) + '\n'
+
+    def save(self, path: str):
+        """
+        Writes the report as JSON or, if path ends with '.folded', in folded stack format.
+        """
+        with open(path, 'w') as f:
+            if path.endswith('.folded'):
+                f.write(self.folded())
+            else:
+                json.dump(self.report(), f)
+
+
+def _span(profiler, name):
+    # Profiler of the running call takes precedence over the one assigned to the connector
+    profiler = getattr(_active, 'profiler', None) or profiler
+    return nullcontext() if profiler is None else profiler.span(name)
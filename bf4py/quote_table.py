@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading, time
+from array import array
+
+NAN = float('nan')
+
+DEFAULT_FIELDS = ('bidLimit', 'askLimit', 'bidSize', 'askSize', 'lastPrice')
+
+
+class QuoteTable():
+    """
+    Latest values of many instruments in preallocated float64 arrays, one row per (ISIN, MIC) and
+    one column per field. Stream clients write received messages with update(), readers look up single
+    values in O(1) with get() or take a consistent copy of all rows with snapshot().
+    """
+    def __init__(self, fields: tuple = DEFAULT_FIELDS, capacity: int = 1024):
+        """
+        Parameters
+        ----------
+        fields : tuple, optional
+            Numeric message fields to keep. The default is best bid/ask, their sizes and last price.
+        capacity : int, optional
+            Number of preallocated rows, grows by doubling if exceeded. The default is 1024.
+
+        """
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.columns = {f: array('d', [NAN]) * capacity for f in self.fields}
+        self.updated = array('d', [NAN]) * capacity
+        self.keys = []
+        self.rows = {}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, isin, mic):
+        row = self.rows.get((isin, mic))
+        if row is None:
+            row = len(self.keys)
+            if row == self.capacity:
+                for c in self.columns.values():
+                    c.extend(array('d', [NAN]) * self.capacity)
+                self.updated.extend(array('d', [NAN]) * self.capacity)
+                self.capacity *= 2
+            self.keys.append((isin, mic))
+            self.rows[(isin, mic)] = row
+        return row
+
+    def update(self, isin: str, mic: str, data: dict, received: float = None):
+        """
+        Writes numeric fields of a message (e.g. quote_box, price_information or bid_ask_overview) into the row of given instrument.
+        Fields missing in the message keep their previous value.
+        """
+        if isinstance(data.get('data'), list) and len(data['data']) > 0:
+            # Order book messages carry their levels in a list, best level first
+            data = dict(data, **data['data'][0])
+        values = []
+        for f in self.fields:
+            v = data.get(f)
+            if v is not None:
+                try:
+                    values.append((self.columns[f], float(v)))
+                except (TypeError, ValueError):
+                    pass
+
+        with self._lock:
+            row = self._row(isin, mic)
+            for column, v in values:
+                column[row] = v
+            self.updated[row] = time.time() if received is None else received
+            self.version += 1
+
+    def get(self, isin: str, mic: str = 'XETR', field: str = None):
+        """
+        Returns latest value of one field or, if field is None, dict of all fields with key 'updated'.
+        Unknown instruments and missing values return NaN.
+        """
+        with self._lock:
+            row = self.rows.get((isin, mic))
+            if field is not None:
+                return NAN if row is None else self.columns[field][row]
+            if row is None:
+                return dict({f: NAN for f in self.fields}, updated=NAN)
+            return dict({f: c[row] for f, c in self.columns.items()}, updated=self.updated[row])
+
+    def snapshot(self):
+        """
+        Returns a consistent copy of all rows as dict of columns: 'isin' and 'mic' (lists), 'updated' and one
+        array per field (array.array of float64), plus 'version' counting the updates so far.
+        """
+        with self._lock:
+            n = len(self.keys)
+            result = {f: c[:n] for f, c in self.columns.items()}
+            result['updated'] = self.updated[:n]
+            result['isin'] = [k[0] for k in self.keys]
+            result['mic'] = [k[1] for k in self.keys]
+            result['version'] = self.version
+        return result
+
+    def to_numpy(self):
+        """
+        Like snapshot(), but numeric columns are numpy arrays (requires numpy).
+        """
+        import numpy as np
+        result = self.snapshot()
+        for k in self.fields + ('updated',):
+            result[k] = np.frombuffer(result[k], dtype=np.float64)
+        result['isin'] = np.array(result['isin'], dtype=object)
+        result['mic'] = np.array(result['mic'], dtype=object)
+        return result
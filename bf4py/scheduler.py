@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading, time
+from collections import deque
+from contextlib import contextmanager
+
+
+DEFAULT_CLASSES = {'interactive': {'priority': 0, 'concurrency': 8, 'share': 0.7},
+                   'batch': {'priority': 1, 'concurrency': 4, 'share': 0.3}}
+
+
+class RequestScheduler():
+    """
+    Admits requests by priority class. Every class has a concurrency limit and a share of the
+    request rate. Waiting requests of a higher priority class are admitted before any waiting
+    request of a lower class, within a class requests are admitted in arrival order.
+    Rate budget of idle classes is lent to busy ones.
+    Pass an instance to BF4PyConnector(scheduler=...) and select classes with BF4PyConnector.priority().
+    """
+    def __init__(self, classes: dict = None, rate: float = None, default_class: str = 'interactive'):
+        """
+        Parameters
+        ----------
+        classes : dict, optional
+            {name: {'priority': int (lower is more urgent), 'concurrency': int, 'share': float}}.
+            The default are classes 'interactive' and 'batch', see DEFAULT_CLASSES.
+        rate : float, optional
+            Maximum requests per second over all classes. The default is None (=unlimited).
+        default_class : str, optional
+            Class of requests without explicit priority. The default is 'interactive'.
+
+        """
+        if classes is None:
+            classes = DEFAULT_CLASSES
+        assert default_class in classes, 'Unknown default class ' + str(default_class)
+        for name, c in classes.items():
+            assert c.get('share', 1.) > 0, 'Share of class ' + str(name) + ' must be positive'
+
+        self.classes = {name: dict(c) for name, c in classes.items()}
+        self.rate = rate
+        self.default_class = default_class
+
+        total_share = sum(c.get('share', 1.) for c in self.classes.values())
+        for c in self.classes.values():
+            c['rate'] = None if rate is None else rate * c.get('share', 1.) / total_share
+            c['burst'] = None if rate is None else max(1., c['rate'])
+
+        self._cond = threading.Condition()
+        self._active = {name: 0 for name in self.classes}
+        self._waiting = {name: deque() for name in self.classes}
+        self._tokens = {name: c['burst'] for name, c in self.classes.items()}
+        self._admitted = {name: 0 for name in self.classes}
+        self._last_refill = time.monotonic()
+
+    def _after_fork(self):
+        # Requests of the parent's threads do not exist in a forked child, its condition may be held by one of them
+        self._cond = threading.Condition()
+        self._active = {name: 0 for name in self.classes}
+        self._waiting = {name: deque() for name in self.classes}
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rate is None:
+            return
+        for name, c in self.classes.items():
+            self._tokens[name] = min(c['burst'], self._tokens[name] + elapsed * c['rate'])
+
+    def _token_owner(self, name):
+        # Own budget first, then budget of classes which have nothing to do. A lender keeps one token,
+        # so a class which is only idle between two of its requests does not lose its share.
+        if self.rate is None or self._tokens[name] >= 1.:
+            return name
+        for other in self.classes:
+            if other != name and len(self._waiting[other]) == 0 and self._active[other] == 0 and self._tokens[other] >= 2.:
+                return other
+        return None
+
+    def _blocked_by_higher_priority(self, name):
+        # Only a higher class which could be admitted right now goes first, not one waiting for rate tokens
+        priority = self.classes[name]['priority']
+        for other, c in self.classes.items():
+            if c['priority'] < priority and len(self._waiting[other]) > 0 and self._active[other] < c['concurrency'] \
+                    and self._token_owner(other) is not None:
+                return True
+        return False
+
+    def acquire(self, name: str = None):
+        """
+        Blocks until a request of given class may be sent.
+        """
+        if name is None:
+            name = self.default_class
+        assert name in self.classes, 'Unknown priority class ' + str(name)
+
+        ticket = object()
+        with self._cond:
+            self._waiting[name].append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiting[name][0] is ticket and self._active[name] < self.classes[name]['concurrency'] \
+                            and not self._blocked_by_higher_priority(name):
+                        owner = self._token_owner(name)
+                        if owner is not None:
+                            if self.rate is not None:
+                                self._tokens[owner] -= 1.
+                            self._waiting[name].popleft()
+                            self._active[name] += 1
+                            self._admitted[name] += 1
+                            self._cond.notify_all()
+                            return
+                        # Wait for the next token of this class
+                        self._cond.wait((1. - self._tokens[name]) / self.classes[name]['rate'])
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._waiting[name].remove(ticket)
+                self._cond.notify_all()
+                raise
+
+    def release(self, name: str = None):
+        if name is None:
+            name = self.default_class
+        with self._cond:
+            self._active[name] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, name: str = None):
+        self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def statistics(self):
+        """
+        Returns dict with active, waiting and admitted request counts per class.
+        """
+        with self._cond:
+            return {name: {'active': self._active[name], 'waiting': len(self._waiting[name]), 'admitted': self._admitted[name]}
+                    for name in self.classes}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing, os, struct, threading, time
+from multiprocessing import shared_memory
+
+from .connector import BF4PyConnector, get_connector
+
+
+# Every record starts with a seqlock word, odd while the record is written, followed by the payload:
+# seq, subscription slot, receive timestamp, bid, ask, bid size, ask size, last price (64 bytes)
+_WORD = struct.Struct('<Q')
+_PAYLOAD = struct.Struct('<QI4xdddddd')
+_RECORD_SIZE = _WORD.size + _PAYLOAD.size
+_HEADER_SIZE = 64
+_READ_ATTEMPTS = 1000
+_QUOTE_FIELDS = ('bidLimit', 'askLimit', 'bidSize', 'askSize', 'lastPrice')
+
+NAN = float('nan')
+
+
+def _extract_quote(data):
+    """
+    Returns best bid/ask, sizes and last price of a quote_box or bid_ask_overview message.
+    Missing values are NaN.
+    """
+    if 'bidLimit' not in data and isinstance(data.get('data'), list) and len(data['data']) > 0:
+        # Order book messages carry their levels in a list, best level first
+        data = dict(data['data'][0], lastPrice=data.get('lastPrice'))
+    return tuple(NAN if data.get(f) is None else float(data[f]) for f in _QUOTE_FIELDS)
+
+
+class _QuoteRing():
+    """
+    Fixed-size records in shared memory. Layout: write counter, ring of records and
+    one record per subscription slot of the shard holding its latest quote.
+    Records are protected by seqlocks, so one writing process never blocks readers.
+    """
+    def __init__(self, ring_size: int, slots: int, name: str = None):
+        self.ring_size = ring_size
+        self.slots = slots
+        size = _HEADER_SIZE + (ring_size + max(1, slots)) * _RECORD_SIZE
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.read_seq = 0
+        self._views = []
+        self._lock = threading.Lock()
+
+    def _ring_offset(self, seq):
+        return _HEADER_SIZE + ((seq - 1) % self.ring_size) * _RECORD_SIZE
+
+    def _latest_offset(self, slot):
+        return _HEADER_SIZE + (self.ring_size + slot) * _RECORD_SIZE
+
+    def _store(self, offset, values):
+        version = _WORD.unpack_from(self.buf, offset)[0]
+        _WORD.pack_into(self.buf, offset, version + 1)
+        _PAYLOAD.pack_into(self.buf, offset + _WORD.size, *values)
+        _WORD.pack_into(self.buf, offset, version + 2)
+
+    def _load(self, offset):
+        # Copy the payload and accept it only if the seqlock word was even and unchanged meanwhile
+        for _ in range(_READ_ATTEMPTS):
+            version = _WORD.unpack_from(self.buf, offset)[0]
+            if version & 1:
+                continue
+            values = _PAYLOAD.unpack_from(self.buf, offset + _WORD.size)
+            if _WORD.unpack_from(self.buf, offset)[0] == version:
+                return values
+        return None
+
+    def write(self, slot, subscription, received, quote):
+        """
+        Appends a quote of given local slot, subscription is the global subscription index stored with it.
+        """
+        with self._lock:
+            seq = _WORD.unpack_from(self.buf, 0)[0] + 1
+            values = (seq, subscription, received, *quote)
+            self._store(self._ring_offset(seq), values)
+            self._store(self._latest_offset(slot), values)
+            _WORD.pack_into(self.buf, 0, seq)
+
+    def written(self):
+        return _WORD.unpack_from(self.buf, 0)[0]
+
+    def read_new(self):
+        """
+        Returns records written since last call and the count of records overwritten before they were read.
+        """
+        seq = self.written()
+        lost = 0
+        if seq - self.read_seq > self.ring_size:
+            lost = seq - self.read_seq - self.ring_size
+            self.read_seq = seq - self.ring_size
+
+        records = []
+        for s in range(self.read_seq + 1, seq + 1):
+            record = self._load(self._ring_offset(s))
+            # Overwritten by the writer meanwhile
+            if record is None or record[0] != s:
+                lost += 1
+                continue
+            records.append(record)
+        self.read_seq = seq
+        return records, lost
+
+    def latest(self, slot):
+        """
+        Returns the payload of the latest record of given local slot, None if it could not be read consistently.
+        """
+        return self._load(self._latest_offset(slot))
+
+    def latest_view(self):
+        """
+        Returns a read-only memoryview on the latest-quote records (no copy). Every record is a seqlock
+        word followed by the payload, readers must check the word is even and unchanged after copying.
+        The view is released by close(), it must not be used afterwards.
+        """
+        start = self._latest_offset(0)
+        view = self.buf[start:start + self.slots * _RECORD_SIZE].toreadonly()
+        self._views.append(view)
+        return view
+
+    def close(self, unlink=False):
+        for view in self._views:
+            try:
+                view.release()
+            except BufferError:
+                # Still exported to someone else (e.g. numpy), the mapping lives until that is gone
+                pass
+        self._views = []
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        if unlink:
+            self.shm.unlink()
+
+
+def _shard_worker(ring_name, ring_size, slots, salt, subscriptions, stop_event):
+    from .live_data import BFStreamClient
+
+    ring = _QuoteRing(ring_size, slots, ring_name)
+    connector = get_connector(salt=salt)
+
+    def make_callback(slot, subscription):
+        def callback(data):
+            ring.write(slot, subscription, time.time(), _extract_quote(data))
+        return callback
+
+    clients = []
+    for slot, (subscription, endpoint, params) in enumerate(subscriptions):
+        client = BFStreamClient(endpoint, params, callback=make_callback(slot, subscription), connector=connector)
+        client.open_stream()
+        clients.append(client)
+
+    while not stop_event.wait(1.0):
+        # Reopen streams which stopped unintentionally
+        for client in clients:
+            if not client.active:
+                client.close()
+                client.open_stream()
+
+    for client in clients:
+        client._cancel()
+    for client in clients:
+        client.close()
+    ring.close()
+
+
+class ShardedLiveData():
+    """
+    Spreads stream subscriptions over several processes. Every worker decodes its events into
+    a shared-memory ring of fixed-size quote records, which the parent reads without copying or pickling.
+    """
+    def __init__(self, subscriptions: list, processes: int = None, ring_size: int = 65536, connector: BF4PyConnector = None):
+        """
+        Parameters
+        ----------
+        subscriptions : list
+            List of tuples (endpoint, isin, mic), endpoint being 'quote_box' or 'bid_ask_overview'.
+        processes : int, optional
+            Number of worker processes. The default is os.cpu_count().
+        ring_size : int, optional
+            Number of records per worker ring. The default is 65536.
+        connector : BF4PyConnector, optional
+            Used to obtain the salt once for all workers.
+
+        """
+        if processes is None:
+            processes = os.cpu_count()
+        processes = max(1, min(processes, len(subscriptions)))
+
+        if connector is None:
+            connector = get_connector()
+        self.salt = connector.salt
+
+        self.subscriptions = [(endpoint, {'isin': isin, 'mic': mic}) for endpoint, isin, mic in subscriptions]
+        self.slots = {}
+        for slot, (endpoint, params) in enumerate(self.subscriptions):
+            self.slots[(endpoint, params['isin'], params['mic'])] = slot
+        # Subscription index -> (worker, slot in the ring of that worker)
+        self._locations = {}
+
+        self.processes = processes
+        self.ring_size = ring_size
+        self.rings = []
+        self.workers = []
+        self.lost = 0
+        self._ctx = multiprocessing.get_context('spawn')
+        self._stop_event = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        if len(self.workers) > 0:
+            return
+        self._stop_event = self._ctx.Event()
+
+        for w in range(self.processes):
+            # Round robin, so liquid names listed together end up on different cores
+            shard = [(slot, endpoint, params) for slot, (endpoint, params) in enumerate(self.subscriptions) if slot % self.processes == w]
+            for local, (slot, _, _) in enumerate(shard):
+                self._locations[slot] = (w, local)
+            ring = _QuoteRing(self.ring_size, len(shard))
+            process = self._ctx.Process(target=_shard_worker,
+                                        args=(ring.name, self.ring_size, len(shard), self.salt, shard, self._stop_event),
+                                        name='bf4py.ShardedLiveData_' + str(w),
+                                        daemon=True)
+            process.start()
+            self.rings.append(ring)
+            self.workers.append(process)
+
+    def poll(self):
+        """
+        Returns all quote records received since last call as tuples
+        (endpoint, isin, mic, receive timestamp, bid, ask, bid size, ask size, last price).
+        """
+        result = []
+        for ring in self.rings:
+            records, lost = ring.read_new()
+            self.lost += lost
+            for seq, slot, *values in records:
+                endpoint, params = self.subscriptions[slot]
+                result.append((endpoint, params['isin'], params['mic'], *values))
+        result.sort(key=lambda r: r[3])
+        return result
+
+    def latest(self, isin: str, endpoint: str = 'quote_box', mic: str = 'XETR'):
+        """
+        Returns latest quote of given subscription as dict or None if nothing was received yet.
+        """
+        w, local = self._locations[self.slots[(endpoint, isin, mic)]]
+        record = self.rings[w].latest(local)
+        if record is None or record[0] == 0:
+            return None
+        seq, _, received, bid, ask, bid_size, ask_size, last = record
+        return {'isin': isin, 'mic': mic, 'received': received,
+                'bidLimit': bid, 'askLimit': ask, 'bidSize': bid_size, 'askSize': ask_size, 'lastPrice': last}
+
+    def close(self, timeout: float = 10):
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for process in self.workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for ring in self.rings:
+            ring.close(unlink=True)
+        self.workers = []
+        self.rings = []
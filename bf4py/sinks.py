@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv, gzip, json, os, queue, sqlite3, threading
+
+
+class Sink():
+    """
+    Base class for storage sinks. Paginated methods pass every page to write(), records are buffered
+    and written in batches of batch_size by _write_batch(), which subclasses implement
+    (e.g. for a message queue). Use as context manager or call close() to write the last batch.
+    """
+    def __init__(self, batch_size: int = 10000):
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, records: list):
+        with self._lock:
+            self._buffer.extend(records)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if len(self._buffer) > 0:
+            batch, self._buffer = self._buffer, []
+            self._write_batch(batch)
+            self.count += len(batch)
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _write_batch(self, batch: list):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+def _quote(identifier):
+    # SQL identifier, embedded double quotes are doubled
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _scalar(value):
+    # Nested values are stored as JSON strings in flat formats
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class NDJSONSink(Sink):
+    """
+    Writes one JSON object per line. Compressed with gzip if path ends with '.gz'.
+    """
+    def __init__(self, path: str, batch_size: int = 10000):
+        super().__init__(batch_size)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+
+    def _write_batch(self, batch):
+        self._file.write(''.join(json.dumps(r) + '\n' for r in batch))
+
+    def _close(self):
+        self._file.close()
+
+
+class CSVSink(Sink):
+    """
+    Writes records as CSV. Columns are taken from fields or the keys of the first batch, other keys are ignored.
+    Nested values are written as JSON.
+    """
+    def __init__(self, path: str, fields: list = None, batch_size: int = 10000, **fmtparams):
+        super().__init__(batch_size)
+        self.path = path
+        self.fields = fields
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._fmtparams = fmtparams
+        self._writer = None
+
+    def _write_batch(self, batch):
+        if self._writer is None:
+            if self.fields is None:
+                self.fields = list(dict.fromkeys(k for r in batch for k in r))
+            self._writer = csv.DictWriter(self._file, self.fields, extrasaction='ignore', **self._fmtparams)
+            self._writer.writeheader()
+        self._writer.writerows({k: _scalar(v) for k, v in r.items()} for r in batch)
+
+    def _close(self):
+        self._file.close()
+
+
+class SQLiteSink(Sink):
+    """
+    Inserts records into an SQLite table with executemany(), one transaction per batch.
+    The table is created from the keys of the first batch, columns for new keys are added on the fly.
+    Nested values are stored as JSON.
+    """
+    def __init__(self, path: str, table: str, batch_size: int = 10000):
+        super().__init__(batch_size)
+        self.path = path
+        self.table = table
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._columns = [r[1] for r in self._db.execute('PRAGMA table_info(' + _quote(table) + ')')]
+
+    def _write_batch(self, batch):
+        keys = list(dict.fromkeys(k for r in batch for k in r))
+        with self._db:
+            if len(self._columns) == 0:
+                self._db.execute('CREATE TABLE ' + _quote(self.table) + ' (' + ', '.join(_quote(k) for k in keys) + ')')
+                self._columns = keys
+            for k in keys:
+                if k not in self._columns:
+                    self._db.execute('ALTER TABLE ' + _quote(self.table) + ' ADD COLUMN ' + _quote(k))
+                    self._columns.append(k)
+
+            sql = ('INSERT INTO ' + _quote(self.table) + ' (' + ', '.join(_quote(k) for k in keys) + ') VALUES ('
+                   + ', '.join('?' * len(keys)) + ')')
+            self._db.executemany(sql, ([_scalar(r.get(k)) for k in keys] for r in batch))
+
+    def _close(self):
+        self._db.close()
+
+
+class ParquetSink(Sink):
+    """
+    Writes records as Parquet file, one row group per batch (requires pyarrow).
+    The schema is given or inferred from the first batch. Later batches are cast to it, missing columns
+    become null. New columns or values which cannot be cast without loss raise ValueError.
+    """
+    def __init__(self, path: str, batch_size: int = 100000, compression: str = 'snappy', schema=None):
+        try:
+            import pyarrow, pyarrow.parquet
+        except ImportError as e:
+            raise ImportError('ParquetSink requires pyarrow, install it with: pip install bf4py[parquet]') from e
+        super().__init__(batch_size)
+        self.path = path
+        self.compression = compression
+        self.schema = schema
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._writer = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _write_batch(self, batch):
+        table = self._pa.Table.from_pylist(batch)
+        if self.schema is None:
+            self.schema = table.schema
+
+        extra = [name for name in table.column_names if name not in self.schema.names]
+        if len(extra) > 0:
+            raise ValueError('Columns ' + ', '.join(extra) + ' are not in the Parquet schema, pass schema to ParquetSink')
+        columns = [table.column(f.name) if f.name in table.column_names else self._pa.nulls(len(table), f.type)
+                   for f in self.schema]
+        try:
+            table = self._pa.Table.from_arrays(columns, names=self.schema.names).cast(self.schema, safe=True)
+        except self._pa.ArrowException as e:
+            raise ValueError('Batch does not match the Parquet schema, pass schema to ParquetSink: ' + str(e)) from e
+
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        self._writer.write_table(table)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ThreadedSink(Sink):
+    """
+    Writes into another sink on a background thread, so fetching continues while a batch is written.
+    At most max_pending pages are queued, write() blocks if the writer falls behind.
+    Errors of the writer are raised by the next write() or close().
+    """
+    def __init__(self, sink: Sink, max_pending: int = 8):
+        super().__init__(batch_size=1)
+        self.sink = sink
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='bf4py.ThreadedSink', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            records = self._queue.get()
+            try:
+                if records is None:
+                    return
+                if self._error is None:
+                    try:
+                        self.sink.write(records)
+                    except BaseException as e:
+                        self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, records: list):
+        self._raise()
+        self._queue.put(list(records))
+        self.count += len(records)
+
+    def flush(self):
+        """
+        Waits until all queued pages are written and flushes the wrapped sink.
+        """
+        self._queue.join()
+        self._raise()
+        self.sink.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        try:
+            self._raise()
+        finally:
+            self.sink.close()
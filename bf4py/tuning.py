@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, tempfile, threading, time
+
+
+class PageSizeTuner():
+    """
+    Learns page sizes per endpoint from measured latencies. For every page size the latency,
+    record count and payload size of full pages are kept. The suggested page size is the one with
+    the highest records per second whose p99 latency stays below target_latency. Page sizes never exceed
+    the endpoint's max_page_size, larger pages would be cut by the server and rated wrongly.
+    Assign an instance to BF4PyConnector.page_tuner to use it for all paginated requests.
+    """
+    def __init__(self, path: str = None, target_latency: float = 10., min_samples: int = 3, window: int = 100,
+                 autosave_interval: float = 30.):
+        """
+        Parameters
+        ----------
+        path : str, optional
+            JSON file to persist measurements. The default is ~/.cache/bf4py/page_sizes.json. Use '' to disable persistence.
+            Persistence is best-effort, an unreadable file is ignored and failed saves are reported but do not raise.
+        target_latency : float, optional
+            Maximum p99 latency (seconds) of one page. Default is 10, well below the read timeout of 15 seconds.
+        min_samples : int, optional
+            Number of measurements before a page size is rated. The default is 3.
+        window : int, optional
+            Number of measurements kept per page size. The default is 100.
+        autosave_interval : float, optional
+            Seconds between automatic saves. The default is 30.
+
+        """
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'bf4py', 'page_sizes.json')
+        self.path = path
+        self.target_latency = target_latency
+        self.min_samples = min_samples
+        self.window = window
+        self.autosave_interval = autosave_interval
+
+        # {function: {page_size: [[seconds, records, bytes], ...]}}
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    stored = json.load(f)
+                self.samples = {function: {int(size): s for size, s in sizes.items()} for function, sizes in stored.items()}
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                print('bf4py could not read page sizes from', self.path, repr(e))
+                self.samples = {}
+
+    def _after_fork(self):
+        # Lock may have been held by another thread of the parent at fork time
+        self._lock = threading.Lock()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self.samples)
+            self._last_save = time.monotonic()
+        tmp_file = None
+        try:
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            # Measurements stay in memory, a failed save must not fail the request which triggered it
+            print('bf4py could not save page sizes to', self.path, repr(e))
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def candidates(self, endpoint):
+        """
+        Returns the page sizes explored for given endpoint (doubling from min_page_size up to max_page_size).
+        """
+        sizes = []
+        size = endpoint.min_page_size
+        while size < endpoint.max_page_size:
+            sizes.append(size)
+            size *= 2
+        sizes.append(endpoint.max_page_size)
+        return sizes
+
+    def observe(self, endpoint, page_size: int, records: int, seconds: float, nbytes: int = None, timeout: bool = False):
+        """
+        Records the measurement of one page. Only full pages and timeouts are rated, since the last page of a result is usually shorter.
+        """
+        if not timeout and records < page_size:
+            return
+        with self._lock:
+            s = self.samples.setdefault(endpoint.function, {}).setdefault(page_size, [])
+            s.append([seconds, records, nbytes])
+            del s[:-self.window]
+            save = self.path and time.monotonic() - self._last_save > self.autosave_interval
+            if save:
+                # Claimed under the lock, so only one of several concurrent pages saves
+                self._last_save = time.monotonic()
+        if save:
+            self.save()
+
+    def statistics(self, endpoint):
+        """
+        Returns dict {page_size: {'samples', 'records_per_second', 'p99_latency', 'bytes_per_record'}} for given endpoint.
+        """
+        with self._lock:
+            sizes = {size: list(s) for size, s in self.samples.get(endpoint.function, {}).items()}
+
+        result = {}
+        for size, s in sizes.items():
+            latencies = sorted(m[0] for m in s)
+            seconds = sum(latencies)
+            records = sum(m[1] for m in s)
+            nbytes = [m[2] for m in s if m[2] is not None]
+            result[size] = {'samples': len(s),
+                            'records_per_second': records / seconds if seconds > 0 else 0.,
+                            'p99_latency': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+                            'bytes_per_record': sum(nbytes) / records if records > 0 and len(nbytes) > 0 else None}
+        return result
+
+    def suggest(self, endpoint):
+        """
+        Returns the page size to use for the next page of given endpoint.
+        """
+        candidates = self.candidates(endpoint)
+        stats = self.statistics(endpoint)
+        rated = {size: st for size, st in stats.items() if st['samples'] >= self.min_samples and size in candidates}
+
+        valid = [size for size, st in rated.items() if st['p99_latency'] < self.target_latency]
+        if len(valid) == 0:
+            if len(rated) == 0:
+                # Measure the default first
+                unrated = stats.get(endpoint.max_page_size)
+                return endpoint.max_page_size if unrated is None or unrated['samples'] < self.min_samples else candidates[0]
+            # Everything rated is too slow, try next smaller size
+            smaller = [size for size in candidates if size < min(rated)]
+            return smaller[-1] if len(smaller) > 0 else candidates[0]
+
+        best = max(valid, key=lambda size: rated[size]['records_per_second'])
+
+        # Explore neighbours of the best size as long as latency leaves room
+        i = candidates.index(best)
+        if i + 1 < len(candidates) and candidates[i + 1] not in rated and rated[best]['p99_latency'] < self.target_latency / 2:
+            return candidates[i + 1]
+        if i > 0 and candidates[i - 1] not in rated:
+            return candidates[i - 1]
+        return best
+
+    def upper_page_size(self, endpoint):
+        return self.candidates(endpoint)[-1]
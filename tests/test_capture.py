@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from bf4py.capture import CaptureReader, CaptureWriter, replay
+
+
+def _interrupted_capture(path, events):
+    # Flushed but never closed, like a killed process: gzip lacks its end marker, a record is cut
+    writer = CaptureWriter(path, flush_interval=0)
+    channel = writer.channel('quote', {'isin': 'X'})
+    for i in range(events):
+        writer.write(channel, b'{"i": %d}' % i)
+    writer.file.write(b'\x01\x02\x03')
+    writer.file.flush()
+
+
+@pytest.mark.parametrize('name', ['capture.bin', 'capture.gz'])
+def test_interrupted_capture_is_read_and_appended(tmp_path, name):
+    path = str(tmp_path / name)
+    _interrupted_capture(path, 100)
+
+    reader = CaptureReader(path)
+    assert len(list(reader.records())) == 100
+    assert reader.truncated
+
+    with CaptureWriter(path) as writer:
+        writer.write(writer.channel('quote', {'isin': 'X'}), b'{"i": 100}')
+    received = []
+    assert replay(path, received.append, speed=0) == 101
+    assert received[-1] == {'i': 100}
+
+
+@pytest.mark.parametrize('name, compress', [('capture.bin', True), ('capture.gz', False)])
+def test_mixed_compression_is_rejected(tmp_path, name, compress):
+    path = str(tmp_path / name)
+    CaptureWriter(path).close()
+    with pytest.raises(ValueError):
+        CaptureWriter(path, compress=compress)
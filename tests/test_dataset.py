@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import date, datetime, timedelta, timezone
+
+from bf4py.dataset import DatasetCatalog
+
+
+class _Fetch():
+    # Counts calls and returns the given records
+    def __init__(self, records):
+        self.records = records
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.records
+
+
+def _day(d):
+    return {'date': d.isoformat(), 'close': float(d.day)}
+
+
+def test_range_up_to_today_is_fetched_again(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    today = date.today()
+    fetch = _Fetch([_day(today - timedelta(days=1))])
+
+    catalog.open('price_history', 'X', today - timedelta(days=5), today, fetch, 'date').close()
+    catalog.open('price_history', 'X', today - timedelta(days=5), today, fetch, 'date').close()
+    assert fetch.calls == 2
+
+
+def test_past_range_is_fetched_once(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    fetch = _Fetch([_day(date(2022, 1, d)) for d in range(1, 32)])
+
+    for _ in range(2):
+        catalog.open('price_history', 'X', date(2022, 1, 1), date(2022, 1, 31), fetch, 'date').close()
+    assert fetch.calls == 1
+
+
+def test_date_end_covers_whole_day(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    catalog.add('tick_data', 'X', date(2022, 1, 10), date(2022, 1, 10), [], datetime(2022, 2, 1, tzinfo=timezone.utc))
+    assert catalog.find('tick_data', 'X', datetime(2022, 1, 10, 12), datetime(2022, 1, 10, 23, 59)) is not None
+    assert catalog.find('tick_data', 'X', date(2022, 1, 10), date(2022, 1, 11)) is None
+
+
+def test_superset_is_cut_to_requested_range(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    fetch = _Fetch([_day(date(2022, 1, d)) for d in range(1, 32)])
+    catalog.open('price_history', 'X', date(2022, 1, 1), date(2022, 1, 31), fetch, 'date').close()
+
+    with catalog.open('price_history', 'X', date(2022, 1, 10), date(2022, 1, 11), fetch, 'date') as dataset:
+        assert [r['date'] for r in dataset.records()] == ['2022-01-10', '2022-01-11']
+    assert fetch.calls == 1
+
+
+def test_times_sales_superset_is_cut(tmp_path):
+    catalog = DatasetCatalog(str(tmp_path))
+    start = datetime(2022, 6, 1, 9, tzinfo=timezone.utc)
+    ticks = [{'time': (start + timedelta(minutes=m)).isoformat(), 'price': float(m)} for m in range(60)]
+
+    class _Equities():
+        def times_sales(self, start, end, isin):
+            return ticks
+
+    catalog.times_sales(_Equities(), start, start + timedelta(hours=1), 'X').close()
+    with catalog.times_sales(None, start + timedelta(minutes=10), start + timedelta(minutes=12), 'X') as dataset:
+        assert list(dataset.column('price')) == [10., 11., 12.]
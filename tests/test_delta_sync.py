@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from bf4py.delta_sync import SearchSync
+
+
+class _FakeConnector():
+    # Serves the current list of records of a search, sorted as given
+    def __init__(self, records):
+        self.records = records
+        self.requests = 0
+
+    def search_request(self, function, params, priority=None):
+        self.requests += 1
+        page = self.records[params['offset']:params['offset'] + params['limit']]
+        return {'recordsTotal': len(self.records), 'data': page}
+
+    def last_response_size(self):
+        return None
+
+
+def _records(isins, price=1.):
+    return [{'isin': i, 'name': i, 'price': price} for i in isins]
+
+
+def _sync(tmp_path, connector, stable_run=0, **kwargs):
+    return SearchSync(str(tmp_path / 'state.json.gz'), 'derivatives', {}, connector, **kwargs).sync(stable_run)
+
+
+def test_added_changed_removed(tmp_path):
+    connector = _FakeConnector(_records(['A', 'B', 'C']))
+    first = _sync(tmp_path, connector)
+    assert [r['isin'] for r in first['added']] == ['A', 'B', 'C']
+
+    connector.records = _records(['A', 'C', 'D'])
+    connector.records[0]['name'] = 'A2'
+    delta = _sync(tmp_path, connector)
+    assert [r['isin'] for r in delta['added']] == ['D']
+    assert [r['isin'] for r in delta['changed']] == ['A']
+    assert delta['removed'] == ['B']
+    assert delta['unchanged'] == 1
+    assert delta['complete'] and delta['total'] == 3
+
+
+def test_ignored_fields_do_not_change_records(tmp_path):
+    connector = _FakeConnector(_records(['A', 'B']))
+    _sync(tmp_path, connector, ignore_fields=['price'])
+    connector.records = _records(['A', 'B'], price=2.)
+    delta = _sync(tmp_path, connector, ignore_fields=['price'])
+    assert delta['changed'] == [] and delta['unchanged'] == 2
+
+
+def test_early_stop_does_not_remove_moved_instruments(tmp_path):
+    isins = ['I%03d' % n for n in range(300)]
+    connector = _FakeConnector(_records(isins))
+    _sync(tmp_path, connector)
+
+    # I001 moved behind the stop point, a new instrument appears at the start
+    connector.records = _records(['NEW'] + isins[:1] + isins[2:250] + isins[1:2] + isins[250:])
+    connector.requests = 0
+    delta = _sync(tmp_path, connector, stable_run=20)
+    assert not delta['complete']
+    assert connector.requests == 1
+    assert [r['isin'] for r in delta['added']] == ['NEW']
+    assert delta['removed'] == []
+    assert delta['total'] == 301
+
+    # A complete run still finds I001 unchanged and reports real removals
+    connector.records = [r for r in connector.records if r['isin'] != 'I299']
+    delta = _sync(tmp_path, connector)
+    assert delta['complete']
+    assert delta['removed'] == ['I299']
+    assert delta['added'] == [] and delta['changed'] == []
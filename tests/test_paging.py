@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random, threading, time
+
+import pytest
+from requests.exceptions import Timeout
+
+from bf4py._utils import Endpoint, _iter_pages, _read_paged, _read_paged_many
+
+
+ENDPOINT = Endpoint('test', max_page_size=100, min_page_size=25)
+
+
+class _FakeConnector():
+    """
+    Serves records 0..total-1 per key. Pages larger than timeout_above time out, at most server_limit
+    records are delivered per page.
+    """
+    def __init__(self, totals, timeout_above=None, server_limit=None, delay=0.):
+        self.totals = totals
+        self.timeout_above = timeout_above
+        self.server_limit = server_limit
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def data_request(self, function, params, priority=None):
+        with self._lock:
+            self.requests.append(dict(params))
+        if self.delay:
+            time.sleep(random.random() * self.delay)
+        if self.timeout_above is not None and params['limit'] > self.timeout_above:
+            raise Timeout()
+        key = params.get('key', 'a')
+        total = self.totals[key]
+        count = params['limit'] if self.server_limit is None else min(params['limit'], self.server_limit)
+        start = params['offset']
+        return {'totalCount': total, 'data': [{'key': key, 'n': n} for n in range(start, min(total, start + count))]}
+
+    def last_response_size(self):
+        return None
+
+
+def _numbers(records):
+    return [r['n'] for r in records]
+
+
+def test_all_pages_are_read():
+    connector = _FakeConnector({'a': 250})
+    assert _numbers(_read_paged(connector, ENDPOINT, {})) == list(range(250))
+    assert [r['limit'] for r in connector.requests] == [100, 100, 100]
+
+
+def test_limit_and_offset():
+    connector = _FakeConnector({'a': 250})
+    assert _numbers(_read_paged(connector, ENDPOINT, {}, limit=120, offset=10)) == list(range(10, 130))
+    assert [r['limit'] for r in connector.requests] == [100, 20]
+
+
+def test_short_pages_advance_by_received_records():
+    connector = _FakeConnector({'a': 250}, server_limit=30)
+    assert _numbers(_read_paged(connector, ENDPOINT, {})) == list(range(250))
+
+
+def test_page_size_is_halved_on_timeout():
+    connector = _FakeConnector({'a': 100}, timeout_above=30)
+    assert _numbers(_read_paged(connector, ENDPOINT, {})) == list(range(100))
+    assert [r['limit'] for r in connector.requests][:3] == [100, 50, 25]
+
+
+def test_timeout_at_min_page_size_is_raised():
+    connector = _FakeConnector({'a': 100}, timeout_above=10)
+    with pytest.raises(Timeout):
+        _read_paged(connector, ENDPOINT, {})
+
+
+def test_stop_before_first_matching_record():
+    connector = _FakeConnector({'a': 250})
+    pages = list(_iter_pages(connector, ENDPOINT, {}, stop=lambda r: r['n'] == 150))
+    assert _numbers([r for p in pages for r in p]) == list(range(150))
+    assert len(connector.requests) == 2
+
+
+def test_sink_gets_every_page():
+    written = []
+
+    class _Sink():
+        def write(self, records):
+            written.append(len(records))
+
+    assert _read_paged(_FakeConnector({'a': 250}), ENDPOINT, {}, sink=_Sink()) == 250
+    assert written == [100, 100, 50]
+
+
+def test_many_keys_are_read_completely():
+    totals = {'a': 0, 'b': 1, 'c': 100, 'd': 1234}
+    connector = _FakeConnector(totals, delay=0.002)
+    result = _read_paged_many(connector, ENDPOINT, {k: {'key': k} for k in totals}, max_workers=4)
+    assert {k: _numbers(v) for k, v in result.items()} == {k: list(range(t)) for k, t in totals.items()}
+
+
+def test_many_keys_split_pages_on_timeout_and_fill_short_pages():
+    totals = {'a': 300, 'b': 77}
+    for connector in (_FakeConnector(totals, timeout_above=40), _FakeConnector(totals, server_limit=30)):
+        result = _read_paged_many(connector, ENDPOINT, {k: {'key': k} for k in totals}, max_workers=3)
+        assert {k: _numbers(v) for k, v in result.items()} == {k: list(range(t)) for k, t in totals.items()}
+
+
+def test_on_page_receives_pages_in_order():
+    totals = {'a': 1000, 'b': 450}
+    pages = {k: [] for k in totals}
+    completed = {}
+    lock = threading.Lock()
+
+    def on_page(key, records):
+        with lock:
+            pages[key].append(_numbers(records))
+
+    def on_complete(key, records):
+        completed[key] = len(records)
+
+    connector = _FakeConnector(totals, delay=0.005)
+    result = _read_paged_many(connector, ENDPOINT, {k: {'key': k} for k in totals}, 8, on_complete, on_page)
+    assert result == totals
+    assert completed == totals
+    for key, total in totals.items():
+        assert [n for p in pages[key] for n in p] == list(range(total))
+
+
+def test_on_page_without_on_complete_returns_counts():
+    totals = {'a': 350}
+    seen = []
+    connector = _FakeConnector(totals, delay=0.005)
+    result = _read_paged_many(connector, ENDPOINT, {'a': {'key': 'a'}}, 4, on_page=lambda k, r: seen.extend(_numbers(r)))
+    assert result == totals
+    assert seen == list(range(350))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading, time
+
+import pytest
+
+from bf4py.scheduler import RequestScheduler
+
+
+def _saturate(scheduler, classes, seconds):
+    # Every thread sends requests of its class back to back until the time is up
+    stop = time.monotonic() + seconds
+
+    def run(name):
+        while time.monotonic() < stop:
+            with scheduler.slot(name):
+                time.sleep(0.005)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in classes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {name: s['admitted'] for name, s in scheduler.statistics().items()}
+
+
+def test_rate_is_split_by_share_under_load():
+    scheduler = RequestScheduler(rate=40)
+    admitted = _saturate(scheduler, ['interactive'] * 8 + ['batch'] * 4, 1.5)
+    # Configured shares are 0.7 and 0.3
+    assert 0.2 <= admitted['batch'] / sum(admitted.values()) <= 0.4
+
+
+def test_idle_class_lends_its_rate():
+    scheduler = RequestScheduler(rate=40)
+    admitted = _saturate(scheduler, ['batch'] * 4, 1.)
+    # Own share alone would allow about 12 + burst
+    assert admitted['batch'] > 25
+
+
+def test_share_must_be_positive():
+    with pytest.raises(AssertionError):
+        RequestScheduler({'interactive': {'priority': 0, 'concurrency': 1, 'share': 0}}, rate=10)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import socket, threading
+
+import pytest
+import requests
+
+from bf4py._sse import SSEStream
+
+
+class _ChunkedResponse():
+    # Response without raw stream, SSEStream falls back to iter_content()
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size=None):
+        for chunk in self.chunks:
+            if chunk is None:
+                raise AssertionError('read beyond the data available')
+            yield chunk
+
+    def close(self):
+        pass
+
+
+def _events(chunks):
+    return [(e.event, e.data, e.id) for e in SSEStream(_ChunkedResponse(chunks)).events()]
+
+
+def test_events_split_across_chunks():
+    chunks = [b'event: quote\nda', b'ta: {"a": 1}\n', b'\nid: 7\ndata: x\ndata: y\n\n']
+    assert _events(chunks) == [('quote', b'{"a": 1}', None), ('message', b'x\ny', '7')]
+
+
+def test_crlf_split_across_chunks():
+    assert _events([b'data: 1\r', b'\n\r\n', b'data: 2\r\n\r\n']) == [('message', b'1', None), ('message', b'2', None)]
+
+
+def test_trailing_cr_ends_event_without_further_data():
+    # None raises if the parser asks for more data before handing out the event
+    events = SSEStream(_ChunkedResponse([b'data: 1\r\r', None])).events()
+    assert next(events).data == b'1'
+
+
+@pytest.fixture
+def close_delimited_server():
+    # HTTP/1.0 style response: neither Content-Length nor chunked encoding, the body ends when the connection closes
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    release = threading.Event()
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection:
+            connection.recv(65536)
+            connection.sendall(b'HTTP/1.0 200 OK\r\nContent-Type: text/event-stream\r\n\r\n')
+            connection.sendall(b'data: {"first": true}\n\n')
+            release.wait(10)
+            connection.sendall(b'data: {"second": true}\n\n')
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/' % listener.getsockname()[1], release
+    release.set()
+    thread.join(5)
+    listener.close()
+
+
+def test_event_of_non_chunked_response_arrives_before_connection_ends(close_delimited_server):
+    url, release = close_delimited_server
+    response = requests.get(url, stream=True, timeout=5)
+    assert 'chunked' not in response.headers.get('transfer-encoding', '')
+
+    events = SSEStream(response).events()
+    # Blocks until the server closes the connection (and times out) if the parser waits for a full read
+    assert next(events).data == b'{"first": true}'
+    release.set()
+    assert next(events).data == b'{"second": true}'
+    response.close()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _probe(code):
+    # Fresh interpreter, so modules imported by other tests do not count
+    output = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=ROOT), cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def test_import_does_not_load_requests_or_facades():
+    loaded = _probe('import json, sys, bf4py; print(json.dumps(sorted(sys.modules)))')
+    assert 'requests' not in loaded
+    assert 'bf4py.connector' not in loaded
+    assert 'bf4py.equities' not in loaded
+
+
+def test_bf4py_is_the_class_after_importing_the_submodule():
+    result = _probe('import json, bf4py, bf4py.BF4Py, bf4py.equities\n'
+                    'print(json.dumps([isinstance(bf4py.BF4Py, type), bf4py.BF4Py().equities.__class__.__name__]))')
+    assert result == [True, 'Equities']